@@ -1,98 +1,491 @@
 """
 This file contains source code for all the audio processing involved in this project.
 """
+from concurrent.futures import Future
+import numpy as np
 import sounddevice as sd
 import soundfile as sf
+import threading
+import io
+import logging
+import atexit
+import typing
+import struct
+import queue
+import mmap
 import os
 import time
-from pydub import AudioSegment
 
-sd.default.samplerate = 16000
+# sample rate expected by the Azure services
+DEFAULT_SAMPLE_RATE = 16000
+
+logger = logging.getLogger(__name__)
+
+# canonical 44-byte header of a PCM_16 WAV file
+WAV_HEADER_SIZE = 44
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+# background writer: recordings are handed over as (path, data, fs, file, future) and written off the caller thread
+_io_q = queue.Queue()
+_io_thread = None
+_io_lock = threading.Lock()
+
+
+def to_pcm16(data: np.ndarray, out: np.ndarray = None, scratch: np.ndarray = None) -> np.ndarray:
+    """
+    Quantizes float samples in [-1, 1] to 16-bit PCM, the format audio files are stored in. Scale, clip and cast are
+    performed in place on the given buffers, so that no temporary array is allocated when both are provided.
+    :param data: the audio data (as a float Numpy array).
+    :param out: an int16 Numpy array of the same shape as data, receiving the result; allocated if None.
+    :param scratch: a float32 Numpy array of the same shape as data, used for intermediate results; allocated if None.
+    :return: the audio data as an int16 Numpy array (out, if given).
+    """
+    if scratch is None:
+        scratch = np.empty(data.shape, dtype='float32')
+    if out is None:
+        out = np.empty(data.shape, dtype=np.int16)
+
+    np.multiply(data, 32767, out=scratch)
+    np.clip(scratch, -32767, 32767, out=scratch)
+    np.copyto(out, scratch, casting='unsafe')
+    return out
+
+
+def configure_defaults(fs: int = DEFAULT_SAMPLE_RATE) -> None:
+    """
+    Sets the sounddevice defaults used by playback and by recordings not bound to an Audio object.
+    :param fs: the default sample rate.
+    :return: None
+    """
+    sd.default.samplerate = fs
+
+
+def wav_header(fs: int, channels: int, frames: int) -> bytes:
+    """
+    Builds the header of a PCM_16 WAV file.
+    :param fs: the sample rate of the audio data.
+    :param channels: the number of channels of the audio data.
+    :param frames: the number of frames of the audio data.
+    :return: the WAV header as bytes.
+    """
+    data_size = frames * channels * 2
+    return _WAV_HEADER.pack(b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels, fs,
+                            fs * channels * 2, channels * 2, 16, b'data', data_size)
+
+
+def write_wav(file: typing.BinaryIO, data: np.ndarray, fs: int,
+              out: np.ndarray = None, scratch: np.ndarray = None) -> None:
+    """
+    Writes the given audio data as a PCM_16 WAV file, from the current position of file: the header is packed
+    directly and the samples are quantized and written as a single raw block.
+    :param file: a binary file object opened for writing.
+    :param data: the audio data (as a (frames, channels) float Numpy array).
+    :param fs: the sample rate of the audio data.
+    :param out: a flat int16 Numpy array of at least data.size elements, reused to hold the quantized samples.
+    :param scratch: a flat float32 Numpy array of at least data.size elements, reused for intermediate results.
+    :return: None
+    """
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    frames, channels = data.shape
+    file.write(wav_header(fs, channels, frames))
+
+    # WAV samples are interleaved, i.e. row-major: viewing the flat buffers as C-ordered arrays interleaves for free
+    if out is not None:
+        out = out[:data.size].reshape(frames, channels)
+    if scratch is not None:
+        scratch = scratch[:data.size].reshape(frames, channels)
+    file.write(np.ascontiguousarray(to_pcm16(data, out=out, scratch=scratch)))
+
+
+def remove_silences(data: np.ndarray, fs: int, window_ms: int = 20, threshold: float = 0.005) -> np.ndarray:
+    """
+    Removes every silent stretch from the given audio, using the RMS level over a sliding window centered on each frame.
+    :param data: the audio data (as a (frames, channels) float Numpy array).
+    :param fs: the sample rate of the audio data.
+    :param window_ms: the length (in milliseconds) of the sliding window.
+    :param threshold: the RMS level (in full scale units) below which a frame is considered silent.
+    :return: a new (frames, channels) array only holding the voiced frames, possibly empty.
+    """
+    window = max(1, fs * window_ms // 1000)
+    energy = np.square(data, dtype=np.float64).mean(axis=1)
+
+    # moving average through cumulative sums: linear in the number of frames, whatever the window length
+    csum = np.concatenate(([0.0], np.cumsum(energy)))
+    lo = np.clip(np.arange(energy.size) - window // 2, 0, energy.size)
+    hi = np.clip(lo + window, 0, energy.size)
+    mean_energy = (csum[hi] - csum[lo]) / (hi - lo)
+
+    return data[mean_energy > threshold * threshold]
+
+
+def prepare_for_azure(path: str, fs: int = DEFAULT_SAMPLE_RATE) -> typing.Optional[bytes]:
+    """
+    Checks whether the audio file at path is what the Azure services expect, i.e. a mono PCM_16 WAV file at 16 kHz,
+    converting it in memory otherwise: channels are averaged and the sample rate is changed by linear interpolation.
+    The file itself is never modified.
+    :param path: the path of the audio file.
+    :param fs: the sample rate the audio has to be converted to.
+    :return: None if the file can be uploaded as it is, the content of the converted WAV file otherwise.
+    """
+    info = sf.info(path)
+    if info.format == 'WAV' and info.samplerate == fs and info.channels == 1 and info.subtype == 'PCM_16':
+        return None
+
+    data, orig_fs = sf.read(path, dtype='float32', always_2d=True)
+    mono = data.mean(axis=1)
+    if orig_fs != fs:
+        # when downsampling, a short moving average attenuates what would otherwise alias back into the speech band
+        width = int(round(orig_fs / fs))
+        if width > 1:
+            mono = np.convolve(mono, np.full(width, 1 / width, dtype=np.float32), mode='same')
+        frames = int(round(mono.shape[0] * fs / orig_fs))
+        mono = np.interp(np.arange(frames) * (orig_fs / fs), np.arange(mono.shape[0]), mono).astype(np.float32)
+
+    buffer = io.BytesIO()
+    write_wav(buffer, mono, fs)
+    return buffer.getvalue()
+
+
+def to_opus(source: typing.Union[str, typing.BinaryIO], opus_path: str) -> str:
+    """
+    Encodes the given WAV audio as Ogg Opus, which speech-to-text accepts and is several times smaller than PCM.
+    :param source: the path of the WAV file, or a binary file object holding its content.
+    :param opus_path: the path the Ogg Opus file is written to.
+    :return: the path of the Ogg Opus file.
+    """
+    data, fs = sf.read(source, dtype='float32')
+    sf.write(opus_path, data, fs, format='OGG', subtype='OPUS')
+    return opus_path
+
+
+def _writer() -> None:
+    """
+    Writer thread loop, draining the queue of pending audio files in batches.
+    :return: None
+    """
+    # quantization buffers, owned by this thread and grown to the largest recording seen so far
+    out = np.empty(0, dtype=np.int16)
+    scratch = np.empty(0, dtype='float32')
+
+    while True:
+        batch = [_io_q.get()]
+
+        # drain everything else already pending, so that a burst of recordings is handled in a single wake-up
+        while True:
+            try:
+                batch.append(_io_q.get_nowait())
+            except queue.Empty:
+                break
+
+        for path, data, fs, file, future in batch:
+            try:
+                if data.size > out.size:
+                    out = np.empty(data.size, dtype=np.int16)
+                    scratch = np.empty(data.size, dtype='float32')
+
+                if file is not None:
+                    # rewrite the already open file in place, saving the open/close
+                    file.seek(0)
+                    write_wav(file, data, fs, out=out, scratch=scratch)
+                    file.truncate()
+                    file.flush()
+                else:
+                    with open(path, 'wb') as f:
+                        write_wav(f, data, fs, out=out, scratch=scratch)
+                future.set_result(path)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                _io_q.task_done()
+
+
+def submit_write(path: str, data: np.ndarray, fs: int, file: typing.BinaryIO = None) -> Future:
+    """
+    Schedules the given audio data to be written to path by the background writer thread.
+    :param path: the path where the audio will be stored in.
+    :param data: the audio data (as a Numpy array); it must not be modified until the write is completed.
+    :param fs: the sample rate of the audio data.
+    :param file: an already open binary handle to path, to be rewritten instead of opening path again.
+    :return: a Future resolving to the path once the file has been written.
+    """
+    global _io_thread
+    with _io_lock:
+        if _io_thread is None:
+            _io_thread = threading.Thread(target=_writer, name="audio-writer", daemon=True)
+            _io_thread.start()
+
+    future = Future()
+    _io_q.put((path, data, fs, file, future))
+    return future
+
+
+def flush() -> None:
+    """
+    Blocks until every pending audio file has been written.
+    :return: None
+    """
+    _io_q.join()
+
+
+atexit.register(flush)
 
 
 class Audio:
 
-    def __init__(self, path: str = None, blocking: bool = False):
+    # frames delivered to each stream callback
+    BLOCKSIZE = 1024
+
+    def __init__(self, path: str = None, blocking: bool = False, max_seconds: int = None, channels: int = 1,
+                 fs: int = None, memory_mapped: bool = False, trim_silence: bool = False):
         """
         :param path: the path where the audio will be stored in.
         :param blocking: a flag that indicates if the recording will be blocking or not.
+        :param max_seconds: the recording length the capture buffer is preallocated for; if None, the buffer is only
+        allocated by rec(), sized to the requested duration, and grown when a longer recording is requested.
+        :param channels: the number of channels to be recorded.
+        :param fs: the sample rate recordings are performed with; if None, the sounddevice default is used, falling back to
+        DEFAULT_SAMPLE_RATE.
+        :param memory_mapped: if True, samples are quantized straight into a memory mapping of the file at path while
+        recording, instead of being written once the recording stops.
+        :param trim_silence: if True, silent stretches are removed from recordings when they stop.
         """
         self.path = path
         self.start = None
         self.end = None
         self.audio = None
         self.block = blocking
+        self.channels = channels
+        self.trim_silence = trim_silence
+        self._fs = int(fs or sd.default.samplerate or DEFAULT_SAMPLE_RATE)
+
+        # capture ring buffer: the stream callback is the only producer, stop() the only consumer; column-major layout
+        # keeps every channel contiguous, so per-channel processing never needs to deinterleave
+        self._rb = self.__allocate(int(max_seconds * self._fs) if max_seconds else 0)
+        self._write_idx = 0
+        self._limit = 0
+        self._stream = None
+        self._done = threading.Event()
+        self._pending = None
+        self._file = None
+        self.memory_mapped = memory_mapped and path is not None
+        self._mm = None
+        self._mm_view = None
+        self._scratch = np.empty((self.BLOCKSIZE, channels), dtype='float32')
 
-    def rec(self, duration: float, fs: int = sd.default.samplerate):
+    def __allocate(self, frames: int) -> np.ndarray:
+        """
+        Allocates a capture buffer able to hold the given number of frames. The buffer is zero-filled right away, so that
+        page faults happen here rather than in the stream callback.
+        :param frames: number of frames the buffer has to hold.
+        :return: a (frames, channels) float32 Numpy array in Fortran order.
+        """
+        rb = np.empty((frames, self.channels), dtype='float32', order='F')
+        rb.fill(0)
+        return rb
+
+    def _callback(self, indata, frames, t, status):
+        """
+        RawInputStream callback, copying the captured frames into the ring buffer. The stream is stopped as soon as the
+        requested duration has been captured.
+        """
+        indata = np.frombuffer(indata, dtype='float32', count=frames * self.channels).reshape(frames, self.channels)
+        start = self._write_idx
+        end = min(start + frames, self._limit)
+        self._rb[start:end] = indata[:end - start]
+        if self._mm_view is not None:
+            to_pcm16(indata[:end - start], out=self._mm_view[start:end], scratch=self._scratch[:end - start])
+        self._write_idx = end
+        if end >= self._limit:
+            raise sd.CallbackStop()
+
+    def rec(self, duration: float = None, fs: int = None, duration_ms: int = None):
         """
         Records and returns an audio sample from default device. If path is not None, the sample will be locally stored
         to path.
-        :param duration: is an integer that indicates how many seconds of recording will be performed.
-        :param fs: is the frequency sampling (sampling rate) of the captured audio expressed as an integer
-        otherwise.
-        """
-        print("Start Recording")
-        self.start = time.time()
-        # recorded audio as a NumPy array
-        self.audio = sd.rec(int(duration * fs), samplerate=fs, channels=1, blocking=self.block)
-        if self.path is not None and self.block is True:
-            self.end = time.time()
-            print("End Recording")
-            sf.write(self.path, self.audio, fs)
-
-    def read_from_file(self):
-        """
-        Read the audio file stored in the FS.
+        :param duration: is a number that indicates how many seconds of recording will be performed.
+        :param fs: is the frequency sampling (sampling rate) of the captured audio expressed as an integer; if None, the
+        sample rate of this Audio object is used.
+        :param duration_ms: alternative to duration, an integer number of milliseconds; the number of frames is then
+        computed with exact integer math.
+        """
+        assert (duration is None) != (duration_ms is None), "Exactly one of duration and duration_ms must be provided."
+
+        fs = fs or self._fs
+        if duration_ms is not None:
+            frames = duration_ms * fs // 1000
+        else:
+            # round rather than truncate: e.g. 0.3 * 44100 evaluates to 13229.999...
+            frames = int(round(duration * fs))
+        if frames > self._rb.shape[0]:
+            self._rb = self.__allocate(frames)
+
+        self._fs = fs
+        self._write_idx = 0
+        self._limit = frames
+        self._done.clear()
+        if self.memory_mapped:
+            self.__map_file(frames)
+        # raw stream: the callback receives the PortAudio buffer itself rather than a freshly allocated NumPy array
+        self._stream = sd.RawInputStream(samplerate=fs, channels=self.channels, dtype='float32', blocksize=self.BLOCKSIZE,
+                                         callback=self._callback, finished_callback=self._done.set)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Start Recording")
+        self.start = time.perf_counter_ns()
+        self._stream.start()
+        if self.block is True:
+            self._done.wait()
+            self.stop()
+
+    def __map_file(self, frames: int) -> None:
+        """
+        Creates the file at path, sized for the given number of frames, and maps its PCM body in memory.
+        :param frames: number of frames the file has to hold.
+        :return: None
+        """
+        self.close()
+        with open(self.path, 'wb') as f:
+            f.write(wav_header(self._fs, self.channels, frames))
+            f.truncate(WAV_HEADER_SIZE + frames * self.channels * 2)
+
+        with open(self.path, 'r+b') as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        self._mm_view = np.frombuffer(self._mm, dtype=np.int16, offset=WAV_HEADER_SIZE,
+                                      count=frames * self.channels).reshape(frames, self.channels)
+
+    def __unmap_file(self, frames: int) -> None:
+        """
+        Releases the memory mapping of the file at path, shrinking it to the given number of frames.
+        :param frames: number of frames actually recorded.
+        :return: None
+        """
+        self._mm_view = None
+        self._mm[:WAV_HEADER_SIZE] = wav_header(self._fs, self.channels, frames)
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        os.truncate(self.path, WAV_HEADER_SIZE + frames * self.channels * 2)
+
+    def read_from_file(self, frames: int = -1):
+        """
+        Read the audio file stored in the FS. Only the requested frames are decoded, so reading a trimmed version of a
+        long recording costs as much as the trimmed length.
+        :param frames: number of frames to read from the start of the file; -1 reads the whole file.
         :return: the audio data (as a Numpy array) and the related sample rate (as an integer).
         """
-        data, fs = sf.read(self.path, dtype='float32')
+        self.flush()
+        with sf.SoundFile(self.path, 'r') as f:
+            data = f.read(frames=frames, dtype='float32')
+            fs = f.samplerate
         return data, fs
 
-    @staticmethod
-    def set_sample_rate(sm: int):
+    def get_audio(self):
+        """
+        Returns the last recorded audio, straight from memory.
+        :return: the audio data (as a Numpy array) and the related sample rate (as an integer).
+        """
+        return self.audio, self._fs
+
+    def to_wav_bytes(self) -> bytes:
+        """
+        Returns the last recorded audio as the content of a PCM_16 WAV file, straight from memory; recordings made with
+        path=None can thus be uploaded without ever touching the file system.
+        :return: the WAV file content as bytes.
+        """
+        if self.audio is None:
+            raise RuntimeError("No recording available.")
+        buffer = io.BytesIO()
+        write_wav(buffer, self.audio, self._fs)
+        return buffer.getvalue()
+
+    def set_sample_rate(self, sm: int):
         """
         Set the sample rate for recording.
         :param sm: is the frequency sampling (sampling rate) of the captured audio expressed as an integer.
         """
+        self._fs = int(sm)
         sd.default.samplerate = sm
 
-    @staticmethod
-    def get_sample_rate():
+    def get_sample_rate(self):
         """
         Return the sample rate for recording.
         :return the frequency sampling (sampling rate) of the captured audio expressed as an integer.
         """
-        return sd.default.samplerate
+        return self._fs
 
     def stop(self):
         """
         Stops a non blocking rec() during an audio acquisition. The registration is immediately terminated without
         waiting for the timeout expressed by the duration argument of rec.
         """
-        sd.stop()
-        if self.path is not None:
-            print("End Recording")
-            self.end = time.time()
-            sf.write(self.path, self.audio, self.get_sample_rate())
-            duration = self.get_real_duration() * 1000
-            audio = AudioSegment.from_wav(self.path)[:duration]
-            self.delete()
-            audio.export(self.path, format="wav")
-            self.audio, fs = self.read_from_file()
+        if self._stream is None:
+            return
+
+        self._stream.stop()
+        self._stream.close()
+        self._stream = None
+        self.end = time.perf_counter_ns()
+
+        # the write index already marks the real end of the recording; a copy is kept since the buffer is reused by the
+        # next rec() while the writer thread may still be saving this one
+        frames = self._write_idx
+        if self.trim_silence:
+            # boolean indexing already returns a compacted copy; a recording with nothing above the threshold (i.e. a
+            # very quiet microphone) is kept as it is, since an empty audio file would only be rejected by Azure
+            self.audio = remove_silences(self._rb[:frames], self._fs)
+            if self.audio.shape[0] == 0:
+                logger.debug("No voice detected, silence is not removed.")
+                self.audio = self._rb[:frames].copy()
+            frames = self.audio.shape[0]
+        else:
+            self.audio = self._rb[:frames].copy()
+        if self._mm is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("End Recording")
+            if self.trim_silence:
+                to_pcm16(self.audio, out=self._mm_view[:frames])
+            self.__unmap_file(frames)
+        elif self.path is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("End Recording")
+            if self._file is None:
+                self._file = open(self.path, 'wb')
+            self._pending = submit_write(self.path, self.audio, self._fs, self._file)
+
+    def flush(self):
+        """
+        Blocks until the recorded audio has been written to path, re-raising any error occurred while writing it.
+        """
+        if self._pending is not None:
+            self._pending.result()
+
+    def close(self):
+        """
+        Closes the file handle kept open on path across successive recordings, if any.
+        """
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __del__(self):
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
 
-    @staticmethod
-    def wait():
+    def wait(self):
         """
         If the recording was already finished, this returns immediately; if not, it waits and returns as soon as the
         recording is finished.
         :return: a flag indicating the status of recording.
         """
-        return sd.wait()
+        return self._done.wait()
 
     def delete(self):
         """
         Delete the recorded audio from FS.
         """
+        self.close()
         if self.start is not None:
             os.remove(self.path)
         else:
@@ -102,15 +495,16 @@ class Audio:
         """
         In case of non-blocking audio this method returns the real duration of the audio, removing eventual final
         silences.
-        :return: an integer indicating the real audio duration.
+        :return: a float indicating the real audio duration, in seconds.
         """
-        return self.end - self.start
+        return (self.end - self.start) / 1e9
 
 
 if __name__ == "__main__":
+    configure_defaults()
     a = Audio("../tmp/audio.wav")
     a.rec(60)
     time.sleep(5)
     a.stop()
-    data, fs = sf.read(a.path)
+    data, fs = a.get_audio()
     sd.play(data, fs)
@@ -1,20 +1,285 @@
 """
 This file contains source code for every Microsoft Azure interaction involved in this project.
 """
-from backend.rest_client import RESTClient
-from collections import namedtuple
-from typing import List
+from backend.rest_client import RESTClient, SimpleResponse, _json_loads, _json_dumps
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from typing import Iterator, List
+import threading
+import logging
+import sys
+import hashlib
+import gzip
+import mmap
+import functools
+import asyncio
 import os.path
+import random
 import json
+import csv
+import stat
 import re
 import time
 
 
+logger = logging.getLogger(__name__)
+
 """
 Credentials object refers to credentials associated to a single resource.
 """
 Credentials = namedtuple("Credentials", "key endpoint")
 
+# Azure operation (and profile) IDs are UUIDs
+_OPERATION_ID_REGEX = re.compile("[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}")
+
+# credentials dictionaries parsed so far, keyed by (absolute path, modification time)
+_parsed_credentials = {}
+
+# time (in seconds) profile lookups are served from cache before querying Azure again
+_PROFILE_TTL = 5.0
+_ALL_PROFILES_TTL = 1.0
+
+# Speaker Recognition allows 20 requests per minute for each subscription key; a couple of them are left spare, since
+# requests may reach Azure closer together than they were sent
+_RATE_LIMIT_REQUESTS = 18
+_RATE_LIMIT_PERIOD = 60.0
+
+
+def _enable_debug_output(log: logging.Logger = logger) -> None:
+    """
+    Prints debug messages of the given logger to the standard output, as objects created with debug=True expect.
+    :param log: Logger to enable debug messages for (default: the logger of this module)
+    :return: None
+    """
+
+    log.setLevel(logging.DEBUG)
+    if not log.handlers:
+        log.addHandler(logging.StreamHandler(sys.stdout))
+
+
+def _stat_regular_file(path: str) -> os.stat_result:
+    """
+    Checks that the given path refers to an existing regular file, with a single system call.
+    :param path: Path to the file
+    :return: stat result of the file, raises FileNotFoundError otherwise
+    """
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"{path} not found.")
+    if not stat.S_ISREG(st.st_mode):
+        raise FileNotFoundError(f"{path} must be a regular file.")
+
+    return st
+
+
+def _require_regular_file(path: str) -> int:
+    """
+    Checks that the given path refers to an existing regular file, with a single system call.
+    :param path: Path to the file
+    :return: Size of the file (in bytes), raises FileNotFoundError otherwise
+    """
+
+    return _stat_regular_file(path).st_size
+
+
+def _upload_body(data: memoryview, headers: dict, compress: bool = False) -> (bytes or memoryview, dict):
+    """
+    Prepares an audio upload, optionally gzip-compressing it, with an explicit length so no chunked encoding is used.
+    :param data: Audio file content
+    :param headers: Static headers of the request, never modified
+    :param compress: if True, the body is gzip-compressed; only for endpoints accepting compressed requests
+    :return: tuple (request body, request headers)
+    """
+
+    if compress:
+        # fastest compression level: WAV files shrink considerably anyway, and CPU time is spent before the upload
+        data = gzip.compress(data, compresslevel=1)
+        return data, {**headers, "Content-Encoding": "gzip", "Content-Length": str(len(data))}
+
+    return data, {**headers, "Content-Length": str(len(data))}
+
+
+def _iter_file(path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Reads a file chunk by chunk, so that it can be uploaded with chunked transfer encoding as it is being read.
+    :param path: Path to the file
+    :param chunk_size: Size (in bytes) of each chunk
+    :return: Iterator over the chunks of the file
+    """
+
+    with open(path, "rb", buffering=0) as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _read_audio(audio_path: str) -> memoryview:
+    """
+    Reads an audio file with a single system call into a buffer of its exact size, released along with the request.
+    :param audio_path: Path to the audio file, raises FileNotFoundError if it is not a regular file
+    :return: memoryview on the audio file content
+    """
+
+    size = _require_regular_file(audio_path)
+    buffer = bytearray(size)
+
+    with open(audio_path, "rb", buffering=0) as file:
+        n = file.readinto(buffer)
+
+    return memoryview(buffer)[:n]
+
+
+def _error_message(response: SimpleResponse) -> str:
+    """
+    Extracts the error message from a failed Azure response, falling back to the HTTP reason when the response body
+    carries no Azure error.
+    :param response: SimpleResponse object of the failed request
+    :return: Error message
+    """
+
+    content = response.content
+    if isinstance(content, str):
+        try:
+            content = _json_loads(content)
+        except ValueError:
+            return response.message
+
+    try:
+        return content["error"]["message"]
+    except (TypeError, KeyError):
+        return response.message
+
+
+class _AudioCache:
+    """
+    Keeps audio files that are uploaded over and over (i.e. benchmarks, threshold tuning) memory-mapped, so that the
+    page cache itself is the request body and concurrent requests share a single mapping.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        """
+        _AudioCache constructor.
+        :param max_entries: Maximum number of files kept mapped, the least recently used ones are released first
+        """
+
+        self.max_entries = max_entries
+        # {absolute path: (modification time, mmap)}, least recently used first
+        self.__maps = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, audio_path: str) -> memoryview:
+        """
+        Returns the content of the given audio file, mapping it again only if it has changed since the last call.
+        :param audio_path: Path to the audio file, raises FileNotFoundError if it is not a regular file
+        :return: read-only memoryview on the audio file content
+        """
+
+        key = os.path.abspath(audio_path)
+        try:
+            st = _stat_regular_file(audio_path)
+        except FileNotFoundError:
+            with self.__lock:
+                self.__maps.pop(key, None)
+            raise
+
+        # empty files cannot be mapped
+        if st.st_size == 0:
+            return memoryview(b"")
+
+        with self.__lock:
+            entry = self.__maps.get(key)
+            if entry is None or entry[0] != st.st_mtime_ns:
+                with open(audio_path, "rb") as file:
+                    mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+                # outdated mappings are released once the last request using them is done
+                entry = self.__maps[key] = (st.st_mtime_ns, mm)
+                self.__evict()
+            self.__maps.move_to_end(key)
+
+        return memoryview(entry[1])
+
+    def __evict(self):
+        """
+        Drops the mappings of files that no longer exist, then the least recently used ones beyond max_entries.
+        Must be called holding the lock.
+        """
+
+        for key in [key for key in self.__maps if not os.path.isfile(key)]:
+            del self.__maps[key]
+        while len(self.__maps) > self.max_entries:
+            self.__maps.popitem(last=False)
+
+
+_audio_cache = _AudioCache()
+
+
+class _RateLimiter:
+    """
+    Thread-safe sliding-window rate limiter, allowing at most capacity requests in any period of time.
+    """
+
+    def __init__(self, capacity: int, period: float):
+        """
+        _RateLimiter constructor.
+        :param capacity: Maximum number of requests allowed in a period of time
+        :param period: Length (in seconds) of the period of time
+        """
+
+        self.capacity = capacity
+        self.period = period
+        self.__timestamps = deque()
+        self.__lock = threading.Lock()
+
+    def acquire(self, cancel: threading.Event = None) -> None:
+        """
+        Records a new request, sleeping only as long as needed for the oldest request in the window to fall out of it;
+        the lock is not held while sleeping, so other threads (i.e. cancelled ones) are never stuck behind a sleeper.
+        :param cancel: Event that, once set, stops waiting with a CancelledError, without recording the request (Optional)
+        :return: None
+        """
+
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise CancelledError("Request was cancelled while waiting for the rate limit.")
+
+            with self.__lock:
+                now = time.monotonic()
+                while self.__timestamps and now - self.__timestamps[0] >= self.period:
+                    self.__timestamps.popleft()
+                if len(self.__timestamps) < self.capacity:
+                    self.__timestamps.append(now)
+                    return
+                wait = self.period - (now - self.__timestamps[0])
+
+            if cancel is not None:
+                cancel.wait(wait)
+            else:
+                time.sleep(wait)
+
+
+# rate limiters shared by all the clients using the same subscription key
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter_for(key: str) -> _RateLimiter:
+    """
+    Returns the rate limiter associated to the given subscription key, creating it if needed.
+    :param key: Azure subscription key
+    :return: _RateLimiter for the given key
+    """
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = _RateLimiter(capacity=_RATE_LIMIT_REQUESTS, period=_RATE_LIMIT_PERIOD)
+        return limiter
+
 
 class CredentialsManager:
     """
@@ -32,27 +297,29 @@ class CredentialsManager:
         if not os.path.isfile(credentials_path):
             raise FileNotFoundError("{file} must be a regular file.".format(file=credentials_path))
 
-        # create credentials dictionary for future use
-        self.credentials = {}
+        self.credentials_path = credentials_path
 
-        # read CSV file
-        with open(credentials_path) as file:
-            first_line = True
-            for line in file:
+        # reuse the credentials dictionary already parsed in this process, unless the file has changed since then
+        cache_key = (os.path.abspath(credentials_path), os.stat(credentials_path).st_mtime_ns)
+        self.credentials = _parsed_credentials.get(cache_key)
+        if self.credentials is None:
+            self.reload()
 
-                # skip CSV header
-                if first_line:
-                    first_line = False
-                    continue
+    def reload(self) -> None:
+        """
+        Reads the credentials file again (i.e. after rotating API keys); lookups are served from memory until then.
+        :return: None
+        """
 
-                line = line.strip("\n")
-                line = line.split(",")
+        cache_key = (os.path.abspath(self.credentials_path), os.stat(self.credentials_path).st_mtime_ns)
 
-                # only process 3-token lines (resource, key, endpoint)
-                if len(line) == 3:
-                    resource = line[0]
-                    creds = Credentials(key=line[1], endpoint=line[2])
-                    self.credentials[resource] = creds
+        # read CSV file, skipping its header and only processing 3-token lines (resource, key, endpoint)
+        with open(self.credentials_path, newline="") as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            self.credentials = {row[0]: Credentials._make(row[1:]) for row in reader if len(row) == 3}
+
+        _parsed_credentials[cache_key] = self.credentials
 
     def get(self, resource: str) -> Credentials:
         """
@@ -72,53 +339,116 @@ class SpeechToTextClient:
     This class implements an Azure client for the Speech REST API.
     """
 
-    def __init__(self, credentials: Credentials, debug: bool = False):
+    __slots__ = ("credentials", "client", "__debug", "_base", "_auth_headers", "_audio_headers", "_opus_headers",
+                 "_stt_url", "_stt_params", "_stt_cache_dir")
+
+    def __init__(self, credentials: Credentials, client: RESTClient = None, debug: bool = False,
+                 cache_directory: str = None):
         """
         SpeechToTextClient constructor.
         :param credentials: Credentials object associated to the SpeechToText resource
+        :param client: REST client to be used for all Azure requests; if None, the process-wide one is used
         :param debug: if True, debug messages are printed to the standard output
+        :param cache_directory: Path to a directory where to store recognition results, reused for identical audio files; if None, results are not cached
         """
 
         self.credentials = credentials
         self.__debug = debug
 
         # REST client to be used for all Azure requests
-        self.client = RESTClient(debug=self.__debug)
-
-    def recognize(self, audio_path: str, detailed: bool = False) -> json:
+        self.client = client if client is not None else RESTClient.instance(debug=self.__debug)
+
+        # endpoint and headers never change for a given resource, hence they are built only once
+        self._base = credentials.endpoint
+        self._auth_headers = {"Ocp-Apim-Subscription-Key": credentials.key}
+        self._audio_headers = {**self._auth_headers,
+                               "Content-type": "audio/wav; codecs=audio/pcm; samplerate=16000",
+                               "Accept": "application/json"}
+        self._opus_headers = {**self._auth_headers,
+                              "Content-type": "audio/ogg; codecs=opus",
+                              "Accept": "application/json"}
+
+        # recognition URL and query parameters (by detailed flag) are the same for every request
+        self._stt_url = f"{self._base}speech/recognition/conversation/cognitiveservices/v1"
+        self._stt_params = {detailed: {"language": "en-US",
+                                       "format": "detailed" if detailed else "simple"}   # detailed also returns confidence score
+                            for detailed in (False, True)}
+
+        self._stt_cache_dir = cache_directory
+        if self._stt_cache_dir is not None:
+            os.makedirs(self._stt_cache_dir, exist_ok=True)
+
+    def recognize(self, audio_path: str, detailed: bool = False, compress: bool = False, fresh: bool = False,
+                  stream: bool = False, audio_data: bytes = None, cache_key: str = None) -> json:
         """
         Recognizes text from a given audio file.
-        :param audio_path: Path to the audio file
+        :param audio_path: Path to the audio file, either WAV (PCM) or Ogg Opus (.ogg extension); ignored if audio_data is given
         :param detailed: if True, retrieves the detailed version of the Azure response
+        :param compress: if True, the audio file is uploaded gzip-compressed (the endpoint must accept it)
+        :param fresh: if True, any cached result for this audio file is ignored and Azure is queried again
+        :param stream: if True, the audio file is uploaded with chunked transfer encoding while it is being read, instead of being read in memory first (not compatible with compress)
+        :param audio_data: content of a WAV (PCM) file, if already in memory (not compatible with stream)
+        :param cache_key: key identifying the audio content in the cache (i.e. a digest the caller already computed); if None, the uploaded content is hashed
         :return: JSON object containing recognized text and other stats
         """
 
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError("{file} not found.".format(file=audio_path))
-        if not os.path.isfile(audio_path):
-            raise FileNotFoundError("{file} must be a regular file.".format(file=audio_path))
-
-        trailing_url = "speech/recognition/conversation/cognitiveservices/v1"
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key,
-                   "Content-type": "audio/wav; codecs=audio/pcm; samplerate=16000",
-                   "Accept": "application/json"}
-        parameters = {"language": "en-US",
-                      "format": "detailed" if detailed else "simple"}   # detailed also returns confidence score
-
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
-
-        # stream audio file content to the Azure service URL
-        with open(audio_path, "rb") as file:
-            response = self.client.post(url=service_url,
-                                        headers=headers,
-                                        params=parameters,
-                                        data=file)
+        assert not (stream and compress), "Streamed uploads cannot be compressed."
+        assert not (stream and audio_data is not None), "Audio content already in memory cannot be streamed."
+
+        parameters = self._stt_params[bool(detailed)]
+        service_url = self._stt_url
+        if audio_data is None and audio_path.endswith(".ogg"):
+            audio_headers = self._opus_headers
+        else:
+            audio_headers = self._audio_headers
+
+        if stream:
+            _require_regular_file(audio_path)
+            data = None
+        elif audio_data is not None:
+            data = memoryview(audio_data)
+        else:
+            # stream the audio file content from memory
+            data = _read_audio(audio_path)
+
+        # identical audio files are recognized only once, even across program restarts
+        cache_path = None
+        if self._stt_cache_dir is not None:
+            if cache_key is not None:
+                key = cache_key
+            elif data is not None:
+                key = hashlib.blake2b(data, digest_size=16).hexdigest()
+            else:
+                digest = hashlib.blake2b(digest_size=16)
+                for chunk in _iter_file(audio_path):
+                    digest.update(chunk)
+                key = digest.hexdigest()
+            cache_path = os.path.join(self._stt_cache_dir, f"{key}_{parameters['language']}_{parameters['format']}.json")
+            if not fresh and os.path.isfile(cache_path):
+                with open(cache_path, "rb") as file:
+                    return _json_loads(file.read())
+
+        if stream:
+            # Azure starts recognizing as soon as the first chunks arrive, while the rest is still being read
+            data, headers = _iter_file(audio_path), audio_headers
+        else:
+            data, headers = _upload_body(data=data, headers=audio_headers, compress=compress)
+        response = self.client.post(url=service_url,
+                                    headers=headers,
+                                    params=parameters,
+                                    data=data)
 
         if response.code != 200:
             raise RuntimeError("Recognition failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                              msg=response.message))
 
+        # only successful recognitions are cached, other outcomes might be transient
+        if cache_path is not None and response.content["RecognitionStatus"] == "Success":
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(_json_dumps(response.content))
+            os.replace(tmp_path, cache_path)
+
         return response.content
 
 
@@ -127,10 +457,14 @@ class IdentificationClient:
     This class implements an Azure client for the Speaker Recognition REST API regarding the identification task.
     """
 
-    def __init__(self, credentials: Credentials, debug: bool = False):
+    __slots__ = ("credentials", "client", "__debug", "_base", "_auth_headers", "_json_headers", "_enroll_headers",
+                 "_identify_headers", "__profile_cache", "_limiter", "_log")
+
+    def __init__(self, credentials: Credentials, client: RESTClient = None, debug: bool = False):
         """
         IdentificationClient constructor.
         :param credentials: Credentials object associated to the Identification resource
+        :param client: REST client to be used for all Azure requests; if None, the process-wide one is used
         :param debug: if True, debug messages are printed to the standard output
         """
 
@@ -138,9 +472,48 @@ class IdentificationClient:
         self.__debug = debug
 
         # REST client to be used for all Azure requests
-        self.client = RESTClient(debug=self.__debug)
+        self.client = client if client is not None else RESTClient.instance(debug=self.__debug)
+
+        # debug messages are only formatted when the logger is enabled for them
+        if self.__debug:
+            _enable_debug_output()
+        self._log = logger.debug
+
+        # endpoint and headers never change for a given resource, hence they are built only once
+        self._base = credentials.endpoint
+        self._auth_headers = {"Ocp-Apim-Subscription-Key": credentials.key}
+        self._json_headers = {**self._auth_headers, "Content-Type": "application/json"}
+        self._enroll_headers = {**self._auth_headers, "Content-Type": "multipart/form-data"}
+        self._identify_headers = {**self._auth_headers, "Content-Type": "application/octet-stream"}
+
+        # every request made with this subscription key, by any client, counts towards the same rate limit
+        self._limiter = _limiter_for(credentials.key)
+
+        # recent profile lookups as {profile ID: (expiration time, JSON)}; the None key holds the list of all profiles
+        self.__profile_cache = {}
+
+    def __cached_profile(self, key: str or None) -> json:
+        """
+        Returns the cached JSON for the given profile lookup, if any and not expired yet.
+        :param key: Azure profile ID, or None for the list of all profiles
+        :return: cached JSON, or None if it has to be fetched again
+        """
+
+        entry = self.__profile_cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def __invalidate_profile(self, profile_id: str = None) -> None:
+        """
+        Drops cached lookups that a write operation on the given profile makes stale.
+        :param profile_id: Azure profile ID, or None if only the list of all profiles is affected
+        :return: None
+        """
 
-        self.operation_id_regex = re.compile("^[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}$")
+        if profile_id is not None:
+            self.__profile_cache.pop(profile_id, None)
+        self.__profile_cache.pop(None, None)
 
     def is_valid(self, operation_id: str) -> bool:
         """
@@ -149,7 +522,23 @@ class IdentificationClient:
         :return: True if operation_id is a valid Azure operation ID, False otherwise
         """
 
-        return self.operation_id_regex.fullmatch(operation_id) is not None
+        # cheap structural checks first, the regex only runs on strings shaped like a UUID
+        if len(operation_id) != 36 or operation_id[8] != "-" or operation_id[13] != "-" \
+                or operation_id[18] != "-" or operation_id[23] != "-":
+            return False
+        return _OPERATION_ID_REGEX.fullmatch(operation_id) is not None
+
+    @staticmethod
+    async def __run_async(method, *args, **kwargs):
+        """
+        Runs a blocking method of this client in the default executor, so that the event loop is not blocked while
+        waiting for Azure.
+        :param method: Blocking method to run
+        :return: Whatever the method returns
+        """
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, functools.partial(method, *args, **kwargs))
 
     # --- profile management ---
     def new_profile(self) -> str:
@@ -158,24 +547,21 @@ class IdentificationClient:
         :return: Azure profile ID in case of success, raises an error otherwise
         """
 
-        trailing_url = "identificationProfiles"
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key,
-                   "Content-Type": "application/json"}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
+        service_url = f"{self._base}identificationProfiles"
         body = {"locale": "en-US"}
 
+        self._limiter.acquire()
         response = self.client.post(url=service_url,
-                                    headers=headers,
+                                    headers=self._json_headers,
                                     body=body)
         if response.code != 200:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("New profile failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                              msg=msg))
 
         profile_id = response.content["identificationProfileId"]
-        if self.__debug:
-            print("Profile ID: {id}".format(id=profile_id))
+        self.__invalidate_profile()
+        self._log("Profile ID: %s", profile_id)
 
         return profile_id
 
@@ -186,61 +572,114 @@ class IdentificationClient:
         :return: True in case of success, raises an error otherwise
         """
 
-        trailing_url = "identificationProfiles/{id}".format(id=profile_id)
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
+        service_url = f"{self._base}identificationProfiles/{profile_id}"
 
+        self._limiter.acquire()
         response = self.client.delete(url=service_url,
-                                      headers=headers)
+                                      headers=self._auth_headers)
 
         if response.code != 200:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("Delete profile failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                                 msg=msg))
 
+        self.__invalidate_profile(profile_id)
         return True
 
-    def new_enrollment(self, profile_id: str, audio_path: str, short_audio: bool = False) -> str:
+    async def del_profile_async(self, profile_id: str) -> bool:
+        """
+        Asynchronous version of del_profile.
+        :param profile_id: Azure profile ID
+        :return: True in case of success, raises an error otherwise
+        """
+
+        return await self.__run_async(self.del_profile, profile_id=profile_id)
+
+    def new_enrollment(self, profile_id: str, audio_path: str, short_audio: bool = False, prefetch: bool = False,
+                       compress: bool = False, audio_data: bytes = None) -> str:
         """
         Creates a new enrollment request for the given profile with the given audio file.
         :param profile_id: Azure profile ID
-        :param audio_path: Path to the audio file
+        :param audio_path: Path to the audio file; ignored if audio_data is given
         :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minuts max anyway)
+        :param prefetch: if True, the audio file is kept memory-mapped for further requests using it
+        :param compress: if True, the audio file is uploaded gzip-compressed (the endpoint must accept it)
+        :param audio_data: content of the audio file, if already in memory (i.e. never written to disk)
         :return: Azure operation ID assigned to this enrolment request, raises an error otherwise
         """
 
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError("{file} not found.".format(file=audio_path))
-        if not os.path.isfile(audio_path):
-            raise FileNotFoundError("{file} must be a regular file.".format(file=audio_path))
-
-        trailing_url = "identificationProfiles/{id}/enroll".format(id=profile_id)
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key,
-                   "Content-Type": "multipart/form-data"}
         parameters = {"shortAudio": short_audio}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
-
-        with open(audio_path, "rb") as file:
-            response = self.client.post(url=service_url,
-                                        headers=headers,
-                                        params=parameters,
-                                        data=file,
-                                        response_headers=True,
-                                        expect_json=False)
+        service_url = f"{self._base}identificationProfiles/{profile_id}/enroll"
+
+        # stream the audio file content from memory
+        if audio_data is not None:
+            data = audio_data
+        else:
+            data = _audio_cache.get(audio_path) if prefetch else _read_audio(audio_path)
+        data, headers = _upload_body(data=data, headers=self._enroll_headers, compress=compress)
+        self._limiter.acquire()
+        response = self.client.post(url=service_url,
+                                    headers=headers,
+                                    params=parameters,
+                                    data=data,
+                                    response_headers=True,
+                                    expect_json=False)
 
         if response.code != 202:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("Enrollment failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                             msg=msg))
 
+        self.__invalidate_profile(profile_id)
         enrolment_url = response.headers["Operation-Location"]
-        if self.__debug:
-            print("Enrollment URL: {url}".format(url=enrolment_url))
+        self._log("Enrollment URL: %s", enrolment_url)
 
         return enrolment_url.split("/")[-1]
 
+    async def new_enrollment_async(self, profile_id: str, audio_path: str, short_audio: bool = False,
+                                   prefetch: bool = False, compress: bool = False, audio_data: bytes = None) -> str:
+        """
+        Asynchronous version of new_enrollment.
+        :param profile_id: Azure profile ID
+        :param audio_path: Path to the audio file; ignored if audio_data is given
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minuts max anyway)
+        :param prefetch: if True, the audio file is kept memory-mapped for further requests using it
+        :param compress: if True, the audio file is uploaded gzip-compressed (the endpoint must accept it)
+        :param audio_data: content of the audio file, if already in memory (i.e. never written to disk)
+        :return: Azure operation ID assigned to this enrolment request, raises an error otherwise
+        """
+
+        return await self.__run_async(self.new_enrollment, profile_id=profile_id, audio_path=audio_path,
+                                      short_audio=short_audio, prefetch=prefetch, compress=compress,
+                                      audio_data=audio_data)
+
+    def create_and_enroll(self, audio_path: str, short_audio: bool = False) -> (str, str):
+        """
+        Creates a new profile and immediately submits its first enrollment with the given audio file, over the same
+        kept-alive connection.
+        :param audio_path: Path to the audio file
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minuts max anyway)
+        :return: tuple of strings (Azure profile ID, Azure operation ID of the enrolment request), raises an error otherwise
+        """
+
+        # fail before creating a profile that could never be enrolled
+        _require_regular_file(audio_path)
+
+        profile_id = self.new_profile()
+        operation_id = self.new_enrollment(profile_id=profile_id, audio_path=audio_path, short_audio=short_audio)
+
+        return profile_id, operation_id
+
+    async def create_and_enroll_async(self, audio_path: str, short_audio: bool = False) -> (str, str):
+        """
+        Asynchronous version of create_and_enroll.
+        :param audio_path: Path to the audio file
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minuts max anyway)
+        :return: tuple of strings (Azure profile ID, Azure operation ID of the enrolment request), raises an error otherwise
+        """
+
+        return await self.__run_async(self.create_and_enroll, audio_path=audio_path, short_audio=short_audio)
+
     def reset_enrollments(self, profile_id: str) -> bool:
         """
         Resets all the enrollments performed on the given profile, setting its status back to "Enrolling".
@@ -248,19 +687,18 @@ class IdentificationClient:
         :return: True in case of success, raises an error otherwise
         """
 
-        trailing_url = "identificationProfiles/{id}/reset".format(id=profile_id)
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
+        service_url = f"{self._base}identificationProfiles/{profile_id}/reset"
 
+        self._limiter.acquire()
         response = self.client.post(url=service_url,
-                                    headers=headers)
+                                    headers=self._auth_headers)
 
         if response.code != 200:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("Reset enrollments failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                                    msg=msg))
 
+        self.__invalidate_profile(profile_id)
         return True
 
     def get_profile(self, profile_id: str) -> json:
@@ -270,19 +708,23 @@ class IdentificationClient:
         :return: JSON in case of success, raises an error otherwise
         """
 
-        trailing_url = "identificationProfiles/{id}".format(id=profile_id)
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
+        # bursts of status checks on the same profile only cost a single request
+        cached = self.__cached_profile(profile_id)
+        if cached is not None:
+            return cached
 
+        service_url = f"{self._base}identificationProfiles/{profile_id}"
+
+        self._limiter.acquire()
         response = self.client.get(url=service_url,
-                                   headers=headers)
+                                   headers=self._auth_headers)
 
         if response.code != 200:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("Get profile failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                              msg=msg))
 
+        self.__profile_cache[profile_id] = (time.monotonic() + _PROFILE_TTL, response.content)
         return response.content
 
     def all_profiles(self) -> json:
@@ -291,19 +733,22 @@ class IdentificationClient:
         :return: JSON in case of success, raises an error otherwise
         """
 
-        trailing_url = "identificationProfiles"
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
+        cached = self.__cached_profile(None)
+        if cached is not None:
+            return cached
+
+        service_url = f"{self._base}identificationProfiles"
 
+        self._limiter.acquire()
         response = self.client.get(url=service_url,
-                                   headers=headers)
+                                   headers=self._auth_headers)
 
         if response.code != 200:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("Get all profiles failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                                   msg=msg))
 
+        self.__profile_cache[None] = (time.monotonic() + _ALL_PROFILES_TTL, response.content)
         return response.content
 
     def del_all_profiles(self) -> bool:
@@ -313,65 +758,102 @@ class IdentificationClient:
         """
 
         all_profiles = self.all_profiles()
-        iters = 1
-        for profile in all_profiles:
-            profile_id = profile["identificationProfileId"]
-            self.del_profile(profile_id=profile_id)
-
-            # prevent the 20 requests in a minute limitation - 20+ requests should be an EXTREME edge case
-            iters += 1
-            if iters == 19:
-                if self.__debug:
-                    print("Waiting in order not to get banned for Azure API constraints.")
-                time.sleep(65)
-                iters = 1
+        profile_ids = [profile["identificationProfileId"] for profile in all_profiles]
+
+        # deletions are independent and issued concurrently; the rate limiter holds them back only when Azure API
+        # constraints would be violated
+        with ThreadPoolExecutor(max_workers=_RATE_LIMIT_REQUESTS) as executor:
+            list(executor.map(lambda profile_id: self.del_profile(profile_id=profile_id), profile_ids))
+
+        return True
+
+    async def del_all_profiles_async(self) -> bool:
+        """
+        Asynchronous version of del_all_profiles: deletions are issued concurrently, without blocking the event loop while
+        the rate limiter holds them back.
+        :return: True in case of success, raises an error otherwise
+        """
+
+        all_profiles = await self.__run_async(self.all_profiles)
+        profile_ids = [profile["identificationProfileId"] for profile in all_profiles]
+
+        # bound the number of executor threads waiting on the rate limiter at the same time
+        semaphore = asyncio.Semaphore(_RATE_LIMIT_REQUESTS)
+
+        async def delete(profile_id: str) -> bool:
+            async with semaphore:
+                return await self.del_profile_async(profile_id=profile_id)
+
+        await asyncio.gather(*[delete(profile_id) for profile_id in profile_ids])
 
         return True
 
     # --- identification ---
-    def new_identification(self, audio_path: str, candidate_ids: List[str], short_audio: bool = False) -> str:
+    def new_identification(self, audio_path: str, candidate_ids: List[str], short_audio: bool = False,
+                           prefetch: bool = False, compress: bool = False, audio_data: bytes = None,
+                           cancel: threading.Event = None) -> str:
         """
         Creates a new request to identify a profile among the given candidates for the given audio file.
         :param audio_path: Path to the audio file
         :param candidate_ids: List of candidate Azure profile IDs
         :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :param prefetch: if True, the audio file is kept memory-mapped for further requests using it
+        :param compress: if True, the audio file is uploaded gzip-compressed (the endpoint must accept it)
+        :param audio_data: content of the audio file, if already read by the caller (i.e. for several identifications)
+        :param cancel: Event that, once set, abandons the request with a CancelledError unless it is already uploaded (Optional)
         :return: Azure operation ID assigned to this identification request, raises an error otherwise
         """
 
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError("{file} not found.".format(file=audio_path))
-        if not os.path.isfile(audio_path):
-            raise FileNotFoundError("{file} must be a regular file.".format(file=audio_path))
         if len(candidate_ids) > 10:
             raise RuntimeError("Candidate IDs list must not exceed the size of 10.")
 
-        trailing_url = "identify"
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key,
-                   "Content-Type": "application/octet-stream"}
         parameters = {"identificationProfileIds": ",".join(candidate_ids),
                       "shortAudio": short_audio}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
-
-        with open(audio_path, "rb") as file:
-            response = self.client.post(url=service_url,
-                                        headers=headers,
-                                        params=parameters,
-                                        data=file,
-                                        response_headers=True,
-                                        expect_json=False)
+        service_url = f"{self._base}identify"
+
+        # stream the audio file content from memory
+        if audio_data is not None:
+            data = audio_data
+        else:
+            data = _audio_cache.get(audio_path) if prefetch else _read_audio(audio_path)
+        data, headers = _upload_body(data=data, headers=self._identify_headers, compress=compress)
+        self._limiter.acquire(cancel=cancel)
+        if cancel is not None and cancel.is_set():
+            raise CancelledError("Identification was cancelled.")
+        response = self.client.post(url=service_url,
+                                    headers=headers,
+                                    params=parameters,
+                                    data=data,
+                                    response_headers=True,
+                                    expect_json=False)
 
         if response.code != 202:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("Enrolment failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                            msg=msg))
 
         identification_url = response.headers["Operation-Location"]
-        if self.__debug:
-            print("Identification URL: {url}".format(url=identification_url))
+        self._log("Identification URL: %s", identification_url)
 
         return identification_url.split("/")[-1]
 
+    async def new_identification_async(self, audio_path: str, candidate_ids: List[str], short_audio: bool = False,
+                                       prefetch: bool = False, compress: bool = False, audio_data: bytes = None) -> str:
+        """
+        Asynchronous version of new_identification.
+        :param audio_path: Path to the audio file
+        :param candidate_ids: List of candidate Azure profile IDs
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :param prefetch: if True, the audio file is kept memory-mapped for further requests using it
+        :param compress: if True, the audio file is uploaded gzip-compressed (the endpoint must accept it)
+        :param audio_data: content of the audio file, if already read by the caller (i.e. for several identifications)
+        :return: Azure operation ID assigned to this identification request, raises an error otherwise
+        """
+
+        return await self.__run_async(self.new_identification, audio_path=audio_path, candidate_ids=candidate_ids,
+                                      short_audio=short_audio, prefetch=prefetch, compress=compress,
+                                      audio_data=audio_data)
+
     # --- operations management ---
     def operation_status(self, operation_id: str) -> json:
         """
@@ -383,27 +865,97 @@ class IdentificationClient:
         assert operation_id is not None, "An operation ID must be provided."
         assert self.is_valid(operation_id), "The provided operation ID is not valid."
 
-        trailing_url = "operations/{id}".format(id=operation_id)
-        headers = {"Ocp-Apim-Subscription-Key": self.credentials.key}
-        service_url = "{endpoint}{trailer}".format(endpoint=self.credentials.endpoint,
-                                                   trailer=trailing_url)
+        service_url = f"{self._base}operations/{operation_id}"
 
+        self._limiter.acquire()
         response = self.client.get(url=service_url,
-                                   headers=headers)
+                                   headers=self._auth_headers)
         if response.code != 200:
-            msg = response.content["error"]["message"]
+            msg = _error_message(response)
             raise RuntimeError("Get operation status failed: POST responded with {code} {msg}".format(code=response.code,
                                                                                                       msg=msg))
 
         return response.content
 
+    def poll_until_done(self, operation_id: str, first_delay: float = 0.0, initial: float = 0.5, factor: float = 1.7,
+                        max_interval: float = 30.0, timeout: float = 300.0, cancel: threading.Event = None) -> json:
+        """
+        Polls the given operation until it either succeeds or fails, waiting exponentially longer (with some jitter)
+        between two checks, or as long as the Retry-After header asks for. Unchanged responses are not transferred
+        again, thanks to conditional GETs on the ETag.
+        :param operation_id: Azure operation ID
+        :param first_delay: Time (in seconds) to wait before the first check
+        :param initial: Time (in seconds) to wait before the second check, and at least between any two checks
+        :param factor: Factor the waiting time is multiplied by after each check
+        :param max_interval: Maximum time (in seconds) to wait between two checks
+        :param timeout: Maximum time (in seconds) to wait for the operation to complete
+        :param cancel: Event that, once set, stops polling with a CancelledError at the next check (Optional)
+        :return: JSON containing the final status in case of success, raises an error otherwise
+        """
+
+        assert operation_id is not None, "An operation ID must be provided."
+        assert self.is_valid(operation_id), "The provided operation ID is not valid."
+
+        service_url = f"{self._base}operations/{operation_id}"
+
+        deadline = time.monotonic() + timeout
+        delay = initial
+        etag = None
+        # waits end as soon as polling is cancelled
+        sleep = cancel.wait if cancel is not None else time.sleep
+        if first_delay > 0:
+            sleep(first_delay)
+        while True:
+            headers = self._auth_headers if etag is None else {**self._auth_headers, "If-None-Match": etag}
+
+            self._limiter.acquire(cancel=cancel)
+            if cancel is not None and cancel.is_set():
+                raise CancelledError("Polling of operation {id} was cancelled.".format(id=operation_id))
+            response = self.client.get(url=service_url,
+                                       headers=headers,
+                                       response_headers=True)
+
+            # 304 Not Modified: the operation is still in the state seen at the previous check
+            if response.code == 200:
+                if response.content["status"] in ("succeeded", "failed"):
+                    return response.content
+                etag = response.headers.get("ETag")
+            elif response.code != 304:
+                msg = _error_message(response)
+                raise RuntimeError("Get operation status failed: GET responded with {code} {msg}".format(code=response.code,
+                                                                                                         msg=msg))
+
+            wait = delay
+            retry_after = response.headers.get("Retry-After") if response.headers is not None else None
+            if retry_after is not None:
+                try:
+                    wait = min(max(float(retry_after), initial), max_interval)
+                except ValueError:
+                    # Retry-After given as an HTTP date
+                    pass
+
+            if time.monotonic() + wait > deadline:
+                raise TimeoutError("Operation {id} did not complete in {t} seconds.".format(id=operation_id,
+                                                                                           t=timeout))
+            sleep(wait + random.uniform(0, 0.2))
+            delay = min(delay * factor, max_interval)
+
+    async def operation_status_async(self, operation_id: str) -> json:
+        """
+        Asynchronous version of operation_status.
+        :param operation_id: Azure operation ID
+        :return: JSON containing the status in case of success, raises an error otherwise
+        """
+
+        return await self.__run_async(self.operation_status, operation_id=operation_id)
+
 
 if __name__ == "__main__":
     op_url = "https://speakerbs2019.cognitiveservices.azure.com/spid/v1.0/operations/258a16aa-0a3a-4e1a-bec3-2d766fda504b"
     op_id = op_url.split("/")[-1]
     print(op_id)
 
-    r = re.compile("^[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}$")
+    r = _OPERATION_ID_REGEX
 
     m = r.fullmatch(op_id)
     print(m)
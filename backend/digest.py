@@ -0,0 +1,41 @@
+"""
+This file contains source code for hashing audio files, whose digests are used as keys by the caches of this project.
+"""
+import hashlib
+import mmap
+import os
+
+
+def audio_digest(path: str, algorithm: str = "sha256") -> str:
+    """
+    Returns the digest of the given audio file, without reading it into a Python buffer first: hashlib.file_digest is
+    used when available (Python 3.11+), otherwise the file is hashed straight from a read-only memory mapping.
+    :param path: Path to the audio file
+    :param algorithm: Name of the hashlib algorithm to be used
+    :return: Hexadecimal digest of the audio file
+    """
+
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, algorithm).hexdigest()
+
+        # empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.new(algorithm).hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.new(algorithm, mm).hexdigest()
+
+
+def bytes_digest(data: bytes, algorithm: str = "sha256") -> str:
+    """
+    Returns the digest of audio content already in memory, equal to the one audio_digest returns for a file holding it.
+    :param data: Audio file content
+    :param algorithm: Name of the hashlib algorithm to be used
+    :return: Hexadecimal digest of the audio content
+    """
+
+    return hashlib.new(algorithm, data).hexdigest()
+
+
+if __name__ == "__main__":
+    print(audio_digest(__file__))
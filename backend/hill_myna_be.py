@@ -1,32 +1,104 @@
 """
 This file contains the Hill Myna backend source code, which is directly called by the GUI.
 """
-from backend.azure import CredentialsManager, SpeechToTextClient, IdentificationClient
+from backend.azure import CredentialsManager, SpeechToTextClient, IdentificationClient, _enable_debug_output
+from backend.rest_client import RESTClient
 from backend.words import WordManager
-from typing import List
-from backend.audio import Audio
+from typing import FrozenSet, List, Sequence, Tuple
+from backend.audio import Audio, prepare_for_azure, to_opus
+from backend.digest import audio_digest, bytes_digest
 from backend.users import User, UsersManager
-from datetime import datetime
 from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import functools
+import requests
+import io
+import asyncio
+import logging
+import json
+import threading
+import tempfile
+import os
+import re
 import time
 
+logger = logging.getLogger(__name__)
+
 """
 Represents a single identification result.
 """
 IdentificationResult = namedtuple("IdentificationResult", "user confidence")
 
+"""
+Represents the outcome of a benchmark evaluation on a single audio file, in the following format:
+- audio_path    path to the evaluated audio file
+- words         set of recognized words, or None in case of error
+- user          identified User, or None
+- elapsed       time (in seconds) spent evaluating the audio file
+- error         error message, or None in case of success
+"""
+BenchmarkResult = namedtuple("BenchmarkResult", "audio_path words user elapsed error")
+
+# enrollments of identical audio files for the same profile are answered with the previous operation ID for this time
+# (in seconds), and at most this many of them are remembered
+_ENROLLMENT_CACHE_TTL = 600
+_ENROLLMENT_CACHE_SIZE = 64
+
+# words in recognized text (lowercase)
+_TOKEN_REGEX = re.compile(r"[a-z']+")
+
+# identifications on different lists of candidates performed at the same time
+_IDENTIFICATION_CONCURRENCY = 10
+
+# messages for completed enrollment statuses (but "Enrolling", which reports the remaining speech time)
+_ENROLLMENT_MESSAGES = {
+    "Training": "Profile is currently in training phase and will be soon ready for identification.",
+    "Enrolled": "Successfully enrolled.",
+}
+
+# profile ID Azure returns when no candidate could be identified
+_NO_MATCH_ID = "00000000-0000-0000-0000-000000000000"
+
+# ordering of Azure identification confidence levels
+_CONFIDENCE_RANKS = {"Low": 1, "Normal": 2, "High": 3}
+
+# error messages for unsuccessful speech-to-text recognition statuses
+_STT_ERRORS = {
+    "NoMatch": "No English word could be recognized in your recording.",
+    "InitialSilenceTimeout": "Too much silence in the start of your recording.",
+    "BabbleTimeout": "Too much noise in the start of your recording.",
+    "Error": "Microsoft Azure internal error.",
+}
+
+# messages for Azure operations that have not completed yet
+_PENDING_OPERATION_MESSAGES = {
+    "running": "The operation is running.",
+    "notstarted": "The operation is not started.",
+}
+
 
 class HillMyna:
     """
     Class implementing the HillMyna backend library, in order to build GUI or CLI applications.
     """
 
+    __slots__ = ("__debug", "data_directory", "tmp_directory", "enrollment_fn", "enrollment_path", "word_threshold",
+                 "confidence_threshold", "operation_check_time", "remove_silences", "opus_speech", "single_candidate_shortcut",
+                 "__credentials_manager", "__words_manager",
+                 "__users_manager", "__rest_client", "speech_resource", "identification_resource", "__speech_client",
+                 "__speaker_client", "ENROLLING", "TRAINING", "ENROLLED", "NO_IDENTIFICATION", "CONFIDENCE_HIGH",
+                 "CONFIDENCE_NORMAL", "CONFIDENCE_LOW", "_pool", "__enrollment_cache_path", "__enrollment_cache",
+                 "__enrollment_cache_lock",
+                 "__clients_lock")
+
     def __init__(self, data_directory: str, tmp_directory: str,
                  credentials_fn: str = "credentials.csv", words_fn: str = "words.txt",
                  users_fn: str = "users.json", enrollment_fn: str = "enrollment.txt",
+                 enrollment_cache_fn: str = "enroll_cache.json",
                  speech_resource: str = "SpeechBS2019", identification_resource: str = "SpeakerBS2019",
                  word_threshold: int = 6, confidence_threshold: str = "High",
-                 operation_check_time: int = 30, remove_silences: bool = False,
+                 operation_check_time: int = 30, remove_silences: bool = False, opus_speech: bool = False,
+                 single_candidate_shortcut: bool = False,
                  debug: bool = False):
         """
         Hill myna backend constructor.
@@ -36,11 +108,14 @@ class HillMyna:
         :param words_fn: Name of the file containing words for anti-spoofing reasons
         :param users_fn: Name of the file containing HillMyna users
         :param enrollment_fn: Name of the file containing text to be used for the enrollment operation
+        :param enrollment_cache_fn: Name of the file remembering recent enrollment operations
         :param speech_resource: Name of the Azure resource to be used for speech-to-text
         :param identification_resource: Name of the Azure resource to be used for speaker identification
         :param word_threshold: Number of minimum recognied words for a successful login
-        :param operation_check_time: Time (in seconds) to wait before querying Azure for operation result; can be tweaked to reduce API limits consume
+        :param operation_check_time: Maximum time (in seconds) between two queries to Azure for an operation result; can be tweaked to reduce API limits consume
         :param remove_silences: (EXPERIMENTAL) if True, silence is detected and removed from audio files before Azure processes it
+        :param opus_speech: if True, audio files are encoded as Ogg Opus before speech-to-text, reducing upload size (speaker identification only accepts WAV)
+        :param single_candidate_shortcut: if True, identification with a single registered user returns it without querying Azure (the voice is NOT verified: only meant for single-user setups)
         :param debug: if True, debug messages are printed to the standard output
         """
 
@@ -49,38 +124,49 @@ class HillMyna:
         assert operation_check_time >= 0, "Invalid value for operation check time."
 
         self.__debug = debug
+        if self.__debug:
+            _enable_debug_output(logger)
         self.data_directory = data_directory
         self.tmp_directory = tmp_directory
         self.enrollment_fn = enrollment_fn
+        self.enrollment_path = os.path.join(data_directory, enrollment_fn)
         self.word_threshold = word_threshold
         self.confidence_threshold = confidence_threshold
         self.operation_check_time = operation_check_time
+        self.remove_silences = remove_silences
+        self.opus_speech = opus_speech
+        self.single_candidate_shortcut = single_candidate_shortcut
 
-        if self.__debug:
-            print("Loading credentials file...")
-        self.__credentials_manager = CredentialsManager("{base}/{filename}".format(base=data_directory,
-                                                                                   filename=credentials_fn))
+        logger.debug("Loading credentials file...")
+        self.__credentials_manager = CredentialsManager(os.path.join(data_directory, credentials_fn))
 
-        if self.__debug:
-            print("Loading words file...")
-        self.__words_manager = WordManager(words_path="{base}/{filename}".format(base=data_directory,
-                                                                                 filename=words_fn),
+        logger.debug("Loading words file...")
+        self.__words_manager = WordManager(words_path=os.path.join(data_directory, words_fn),
                                            debug=self.__debug)
 
-        if self.__debug:
-            print("Loading users file...")
-        self.__users_manager = UsersManager(users_path="{base}/{filename}".format(base=data_directory,
-                                                                                  filename=users_fn))
+        logger.debug("Loading users file...")
+        self.__users_manager = UsersManager(users_path=os.path.join(data_directory, users_fn))
 
-        if self.__debug:
-            print("Initializing speech-to-text client...")
-        creds = self.__credentials_manager.get(speech_resource)
-        self.__SpeechClient = SpeechToTextClient(credentials=creds, debug=self.__debug)
+        # recent enrollments as {"azure_id:audio digest": [operation ID, timestamp]}
+        self.__enrollment_cache_path = os.path.join(data_directory, enrollment_cache_fn)
+        self.__enrollment_cache = {}
+        if os.path.isfile(self.__enrollment_cache_path):
+            with open(self.__enrollment_cache_path) as f:
+                self.__enrollment_cache = json.load(f)
+        self.__enrollment_cache_lock = threading.Lock()
 
-        if self.__debug:
-            print("Initializing speaker identification client...")
-        creds = self.__credentials_manager.get(identification_resource)
-        self.__SpeakerClient = IdentificationClient(credentials=creds, debug=self.__debug)
+        # a single REST client, hence a single connection pool, is shared by all the Azure clients
+        self.__rest_client = RESTClient.instance(debug=self.__debug)
+
+        # Azure clients are only created when first needed (i.e. enrollment sessions never use speech-to-text)
+        self.speech_resource = speech_resource
+        self.identification_resource = identification_resource
+        self.__speech_client = None
+        self.__speaker_client = None
+        self.__clients_lock = threading.Lock()
+
+        # bounded pool running blocking Azure calls on behalf of the *_async methods, keeping the GUI thread free
+        self._pool = ThreadPoolExecutor(max_workers=8)
 
         # profile status constants
         self.ENROLLING = "Enrolling"
@@ -88,12 +174,74 @@ class HillMyna:
         self.ENROLLED = "Enrolled"
 
         # identification contants
-        self.NO_IDENTIFICATION = "00000000-0000-0000-0000-000000000000"
+        self.NO_IDENTIFICATION = _NO_MATCH_ID
         self.CONFIDENCE_HIGH = "High"
         self.CONFIDENCE_NORMAL = "Normal"
         self.CONFIDENCE_LOW = "Low"
 
+    @property
+    def __SpeechClient(self) -> SpeechToTextClient:
+        """
+        Speech-to-text client, created on first access.
+        :return: SpeechToTextClient for the speech resource
+        """
+
+        if self.__speech_client is None:
+            # worker threads (i.e. benchmarks) may get here at the same time, but only one client must be created
+            with self.__clients_lock:
+                if self.__speech_client is None:
+                    logger.debug("Initializing speech-to-text client...")
+                    creds = self.__credentials_manager.get(self.speech_resource)
+                    self.__speech_client = SpeechToTextClient(credentials=creds, client=self.__rest_client,
+                                                              debug=self.__debug,
+                                                              cache_directory=os.path.join(self.tmp_directory,
+                                                                                           "stt_cache"))
+
+        return self.__speech_client
+
+    @property
+    def __SpeakerClient(self) -> IdentificationClient:
+        """
+        Speaker identification client, created on first access.
+        :return: IdentificationClient for the identification resource
+        """
+
+        if self.__speaker_client is None:
+            with self.__clients_lock:
+                if self.__speaker_client is None:
+                    logger.debug("Initializing speaker identification client...")
+                    creds = self.__credentials_manager.get(self.identification_resource)
+                    self.__speaker_client = IdentificationClient(credentials=creds, client=self.__rest_client,
+                                                                 debug=self.__debug)
+
+        return self.__speaker_client
+
     # --- General ---
+    def warm_up(self) -> None:
+        """
+        Connects to the Azure endpoints in the background, so that the first speech-to-text or identification request
+        does not wait for the TCP and TLS handshakes.
+        :return: None
+        """
+
+        for resource in (self.speech_resource, self.identification_resource):
+            try:
+                endpoint = self.__credentials_manager.get(resource).endpoint
+            except RuntimeError:
+                # missing credentials are reported when the resource is actually used
+                continue
+            self._pool.submit(self.__rest_client.warm_up, url=endpoint)
+
+    def close(self) -> None:
+        """
+        Releases the backend thread pool and closes the pooled HTTP connections. Connections are opened again on demand
+        should the REST client be used afterwards (i.e. by another backend instance in the same process).
+        :return: None
+        """
+
+        self._pool.shutdown(wait=False)
+        self.__rest_client.close()
+
     def operation_status(self, operation_id: str, enrollment: bool = False, identification: bool = True) -> (str, str):
         """
         Checks the outcome of either an enrollment or an identification operation. The two are MUTUALLY EXCLUSIVE.
@@ -108,50 +256,145 @@ class HillMyna:
         assert not (enrollment and identification), "Enrollment and identification are two mutually exclusive operations."
         assert enrollment or identification, "An operation must be provided."
 
-        ret = ""
         json_response = self.__SpeakerClient.operation_status(operation_id=operation_id)
+        return self.__operation_result(json_response=json_response, enrollment=enrollment, identification=identification)
+
+    def wait_for_operation(self, operation_id: str, enrollment: bool = False, identification: bool = True,
+                           timeout: float = 300.0, cancel: threading.Event = None) -> (str, str):
+        """
+        Waits for either an enrollment or an identification operation to complete, then returns its outcome in the same
+        format as operation_status. Azure is first checked after half a second, then less and less often, honoring the
+        Retry-After header when present; checks are never further apart than operation_check_time seconds.
+        :param operation_id: Azure operation ID associated either to an enrollment operation, or to an identification one
+        :param enrollment: if True, the operation to check is an enrollment one (MUTUALLY EXCLUSIVE, default: False)
+        :param identification: if True, the operation to check is an identification one (MUTUALLY EXCLUSIVE, default: True)
+        :param timeout: Maximum time (in seconds) to wait for the operation to complete
+        :param cancel: Event that, once set, stops waiting with a CancelledError (Optional)
+        :return: tuple of strings (according to the operation type) encoding the outcome of the operation
+        """
+
+        assert not (enrollment and identification), "Enrollment and identification are two mutually exclusive operations."
+        assert enrollment or identification, "An operation must be provided."
+
+        try:
+            json_response = self.__SpeakerClient.poll_until_done(operation_id=operation_id,
+                                                                 first_delay=0.5,
+                                                                 initial=0.5,
+                                                                 factor=1.5,
+                                                                 max_interval=max(self.operation_check_time, 0.5),
+                                                                 timeout=timeout,
+                                                                 cancel=cancel)
+        except (RuntimeError, TimeoutError):
+            if enrollment:
+                self.__forget_operation(operation_id)
+            raise
+
+        # failed enrollments (i.e. audio too short or too noisy) must not be answered again to retries
+        if enrollment and json_response["status"] == "failed":
+            self.__forget_operation(operation_id)
+
+        return self.__operation_result(json_response=json_response, enrollment=enrollment,
+                                       identification=identification)
+
+    def __operation_result(self, json_response: json, enrollment: bool, identification: bool) -> (str, str):
+        """
+        Decodes the status of either an enrollment or an identification operation, as returned by Azure.
+        :param json_response: JSON containing the operation status
+        :param enrollment: if True, the operation is an enrollment one
+        :param identification: if True, the operation is an identification one
+        :return: tuple of strings (according to the operation type) encoding the status of the operation
+        """
+
+        ret = ""
         status = json_response["status"]
-        if status == "failed":
+        if status in _PENDING_OPERATION_MESSAGES:
+            ret = (status, _PENDING_OPERATION_MESSAGES[status])
+
+        elif status == "failed":
             # fetch the error message
             msg = json_response["message"]
             ret = ("failed", "The operation is failed with message: {msg}.".format(msg=msg))
 
-        elif status == "running":
-            ret = ("running", "The operation is running.")
-
-        elif status == "notstarted":
-            ret = ("notstarted", "The operation is not started.")
-
         elif status == "succeeded":
             # fetch the actual result of the operation
-            json_response = json_response["processingResult"]
-
-            # go through all the enrolment cases
             if enrollment:
-                status = json_response["enrollmentStatus"]
-                if status == self.ENROLLING:
-                    # fetch the remaining time in order to complete enrollment
-                    remaining_time = json_response["remainingEnrollmentSpeechTime"]
-                    ret = (self.ENROLLING, "Enrollment phase can be completed with {time} more seconds.".format(time=remaining_time))
+                ret = self.__enrollment_result(json_response["processingResult"])
+            elif identification:
+                ret = self.__identification_result(json_response["processingResult"])
 
-                elif status == self.TRAINING:
-                    ret = (self.TRAINING, "Profile is currently in training phase and will be soon ready for identification.")
+        return ret
 
-                elif status == self.ENROLLED:
-                    ret = (self.ENROLLED, "Successfully enrolled.")
+    def __enrollment_result(self, processing_result: json) -> (str, str):
+        """
+        Decodes the result of a succeeded enrollment operation.
+        :param processing_result: JSON containing the operation result
+        :return: tuple of strings in the format (enrollment status, message)
+        """
 
-            # go through all the identification cases
-            elif identification:
-                azure_id = json_response["identifiedProfileId"]
-                confidence = json_response["confidence"]
+        status = processing_result["enrollmentStatus"]
+        if status == self.ENROLLING:
+            # fetch the remaining time in order to complete enrollment
+            remaining_time = processing_result["remainingEnrollmentSpeechTime"]
+            return self.ENROLLING, "Enrollment phase can be completed with {time} more seconds.".format(time=remaining_time)
 
-                ret = (azure_id, confidence)
+        message = _ENROLLMENT_MESSAGES.get(status)
+        return (status, message) if message is not None else ""
 
-        return ret
+    @staticmethod
+    def __identification_result(processing_result: json) -> (str, str):
+        """
+        Decodes the result of a succeeded identification operation.
+        :param processing_result: JSON containing the operation result
+        :return: tuple of strings in the format (Azure ID, confidence)
+        """
+
+        return processing_result["identifiedProfileId"], processing_result["confidence"]
+
+    @staticmethod
+    def run_async(coroutine):
+        """
+        Runs an asynchronous backend operation (i.e. the *_async methods of the Azure clients) to completion.
+        GUI code already running an event loop should schedule the coroutine on it instead.
+        :param coroutine: Coroutine to run
+        :return: Whatever the coroutine returns
+        """
+
+        return asyncio.run(coroutine)
+
+    async def __run_in_pool(self, method, *args, **kwargs):
+        """
+        Runs a blocking backend method in the backend thread pool, without blocking the event loop.
+        :param method: Blocking method to run
+        :return: Whatever the method returns
+        """
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(method, *args, **kwargs))
+
+    async def operation_status_async(self, operation_id: str, enrollment: bool = False,
+                                     identification: bool = True) -> (str, str):
+        """
+        Asynchronous version of operation_status.
+        :param operation_id: Azure operation ID associated either to an enrollment operation, or to an identification one
+        :param enrollment: if True, the operation to check is an enrollment one (MUTUALLY EXCLUSIVE, default: False)
+        :param identification: if True, the operation to check is an identification one (MUTUALLY EXCLUSIVE, default: True)
+        :return: tuple of strings (according to the operation type) encoding the status of the operation
+        """
+
+        return await self.__run_in_pool(self.operation_status, operation_id=operation_id, enrollment=enrollment,
+                                        identification=identification)
+
+    def get_session(self) -> requests.Session:
+        """
+        Returns the HTTP session shared by all the Azure clients (i.e. to inspect or mock connections in tests).
+        :return: requests.Session object
+        """
+
+        return self.__rest_client.session
 
     def get_tmp_filename(self, prefix: str, suffix: str, auto_full_path: bool = True) -> str:
         """
-        Returns a temporary filename based on the current timestamp.
+        Returns a temporary filename based on the current timestamp (in nanoseconds, so that names are unique even within the same second).
         :param prefix: Filename prefix, before the timestamp
         :param suffix: Filename suffix, after the timestamp (i.e. extension - with the dot)
         :param auto_full_path: if True, the returned filename is automatically resolved to a path relative to the temporary directory
@@ -159,26 +402,25 @@ class HillMyna:
         """
 
         filename = "{prefix}{ts}{suffix}".format(prefix=prefix,
-                                                 ts=time.mktime(datetime.utcnow().timetuple()),
+                                                 ts=time.time_ns(),
                                                  suffix=suffix)
 
         if auto_full_path:
-            filename = "{base}/{fn}".format(base=self.tmp_directory,
-                                            fn=filename)
+            filename = os.path.join(self.tmp_directory, filename)
 
         return filename
 
-    @staticmethod
-    def start_recording(audio_path: str, duration: int, blocking: bool = False) -> Audio:
+    def start_recording(self, audio_path: str, duration: int, blocking: bool = False) -> Audio:
         """
         Returns an Audio object and starts a recording operation.
+        Silent stretches are removed from the recording when silence removal is enabled.
         :param audio_path: Path to the audio file
         :param duration: Duration of the recording (in seconds)
         :param blocking: if True, the recording operation is blocking
         :return: Audio object referring to the active recording operation
         """
 
-        audio = Audio(path=audio_path, blocking=blocking)
+        audio = Audio(path=audio_path, blocking=blocking, trim_silence=self.remove_silences)
         audio.rec(duration=duration)
 
         return audio
@@ -221,29 +463,43 @@ class HillMyna:
                                  surname=surname,
                                  status=self.ENROLLING)
 
-    def delete_profile(self, username: str = None, azure_id: str = None) -> None:
+    def __resolve_azure_id(self, username: str = None, azure_id: str = None) -> str:
         """
-        Deletes an existing user profile, referenced either by its username or Azure ID.
+        Returns the Azure ID of a profile referenced either by its username or Azure ID.
         If both are provided, the referenced profile MUST be the same.
         :param username: User-chosen nickname (Optional)
         :param azure_id: Azure ID (Optional)
-        :return: None
+        :return: Azure ID of the referenced profile
         """
 
         assert not (username is None and azure_id is None), "Either a username or an Azure ID must be provided."
 
-        if username is not None and azure_id is not None:
-            user_by_username = self.__users_manager.get_by_username(username=username)
-            user_by_azure_id = self.__users_manager.get_by_azure_id(azure_id=azure_id)
-            assert user_by_azure_id.azure_id == user_by_username.azure_id, "Azure ID and username MUST refer to the same user profile, when both provided."
+        if username is None:
+            return azure_id
 
-        # user management: find azure_id if only username is provided
-        elif username is not None:
-            azure_id = self.__users_manager.get_by_username(username=username).azure_id
+        # user management: username index lookup, no scan over all the users
+        user_azure_id = self.__users_manager.get_by_username(username=username).azure_id
+        if azure_id is not None:
+            self.__users_manager.get_by_azure_id(azure_id=azure_id)
+            assert user_azure_id == azure_id, "Azure ID and username MUST refer to the same user profile, when both provided."
+
+        return user_azure_id
+
+    def delete_profile(self, username: str = None, azure_id: str = None) -> None:
+        """
+        Deletes an existing user profile, referenced either by its username or Azure ID.
+        If both are provided, the referenced profile MUST be the same.
+        :param username: User-chosen nickname (Optional)
+        :param azure_id: Azure ID (Optional)
+        :return: None
+        """
+
+        azure_id = self.__resolve_azure_id(username=username, azure_id=azure_id)
 
         if self.__SpeakerClient.del_profile(profile_id=azure_id):
             # user management: delete user profile
             self.__users_manager.remove(azure_id=azure_id)
+            self.__forget_enrollments(azure_id=azure_id)
 
     def delete_all_profiles(self) -> None:
         """
@@ -251,38 +507,147 @@ class HillMyna:
         :return: None
         """
 
-        self.__SpeakerClient.del_all_profiles()
+        self.run_async(self.__SpeakerClient.del_all_profiles_async())
         for users in self.__users_manager.get_all_users():
             for user in users:
                 self.__users_manager.remove(azure_id=user.azure_id)
+        self.__forget_enrollments()
 
-    def enrollment(self, audio_path: str, username: str = None, azure_id: str = None, short_audio: bool = False) -> str:
+    def enrollment(self, audio_path: str = None, username: str = None, azure_id: str = None, short_audio: bool = False,
+                   audio_data: bytes = None) -> str:
         """
         Associates a new enrollment procedure to an existing profile, referenced either by its username or Azure ID.
         If both are provided, the referenced profile MUST be the same.
-        :param audio_path: Path to the audio file
+        :param audio_path: Path to the audio file; ignored if audio_data is given
         :param username: User-chosen nickname (Optional)
         :param azure_id: Azure ID (Optional)
         :param short_audio: if True, audio can be as short as 1 second; otherwise, 5 seconds (Optional, default: False)
+        :param audio_data: Content of a 16 kHz mono PCM_16 WAV file already in memory (i.e. Audio.to_wav_bytes)
         :return: Azure operation ID assigned to this enrolment request status
         """
 
-        assert not (username is None and azure_id is None), "Either a username or an Azure ID must be provided."
+        assert audio_path is not None or audio_data is not None, "An audio file must be provided."
 
-        if username is not None and azure_id is not None:
-            user_by_username = self.__users_manager.get_by_username(username=username)
-            user_by_azure_id = self.__users_manager.get_by_azure_id(azure_id=azure_id)
-            assert user_by_azure_id.azure_id == user_by_username.azure_id, "Azure ID and username MUST refer to the same user profile, when both provided."
+        azure_id = self.__resolve_azure_id(username=username, azure_id=azure_id)
+        if audio_data is None:
+            # files Azure would not accept are converted in memory, the caller's file is left untouched
+            audio_data = prepare_for_azure(path=audio_path)
+        digest = audio_digest(path=audio_path) if audio_data is None else bytes_digest(data=audio_data)
 
-        # user management: find azure_id if only username is provided
-        elif username is not None:
-            azure_id = self.__users_manager.get_by_username(username=username).azure_id
+        # the same recording submitted again for the same profile (i.e. retries) is not uploaded twice
+        key = "{azure_id}:{digest}".format(azure_id=azure_id, digest=digest)
+        with self.__enrollment_cache_lock:
+            cached = self.__enrollment_cache.get(key)
+        if cached is not None and time.time() - cached[1] < _ENROLLMENT_CACHE_TTL:
+            logger.debug("Enrollment already submitted as operation %s.", cached[0])
+            return cached[0]
 
         op_id = self.__SpeakerClient.new_enrollment(profile_id=azure_id,
                                                     audio_path=audio_path,
-                                                    short_audio=short_audio)
+                                                    short_audio=short_audio,
+                                                    audio_data=audio_data)
+
+        # forgotten again should the operation fail (see wait_for_operation), so that retries can succeed
+        with self.__enrollment_cache_lock:
+            self.__enrollment_cache[key] = [op_id, time.time()]
+            self.__write_enrollment_cache()
 
         return op_id
+
+    def __forget_enrollments(self, azure_id: str = None) -> None:
+        """
+        Forgets recent enrollments of the given profile, or of all the profiles.
+        :param azure_id: Azure ID of the profile, or None for all the profiles
+        :return: None
+        """
+
+        with self.__enrollment_cache_lock:
+            if azure_id is None:
+                self.__enrollment_cache.clear()
+            else:
+                prefix = "{azure_id}:".format(azure_id=azure_id)
+                for key in [k for k in self.__enrollment_cache if k.startswith(prefix)]:
+                    del self.__enrollment_cache[key]
+
+            self.__write_enrollment_cache()
+
+    def __forget_operation(self, operation_id: str) -> None:
+        """
+        Forgets the recent enrollment submitted as the given operation, so that the same recording is uploaded again.
+        :param operation_id: Azure operation ID of the enrollment
+        :return: None
+        """
+
+        with self.__enrollment_cache_lock:
+            keys = [k for k, v in self.__enrollment_cache.items() if v[0] == operation_id]
+            if len(keys) == 0:
+                return
+            for key in keys:
+                del self.__enrollment_cache[key]
+
+            self.__write_enrollment_cache()
+
+    def __write_enrollment_cache(self) -> None:
+        """
+        Writes recent enrollments to the JSON file, dropping expired ones and keeping at most the most recent
+        _ENROLLMENT_CACHE_SIZE of them; the caller must hold the enrollment cache lock.
+        :return: None
+        """
+
+        now = time.time()
+        entries = sorted(((k, v) for k, v in self.__enrollment_cache.items() if now - v[1] < _ENROLLMENT_CACHE_TTL),
+                         key=lambda entry: entry[1][1], reverse=True)
+        self.__enrollment_cache = dict(entries[:_ENROLLMENT_CACHE_SIZE])
+
+        # a uniquely named temporary file in the same directory, replacing the JSON file at once
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(self.__enrollment_cache_path) or ".")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.__enrollment_cache, f, indent=4)
+        os.replace(tmp_path, self.__enrollment_cache_path)
+
+    async def enrollment_async(self, audio_path: str, username: str = None, azure_id: str = None,
+                               short_audio: bool = False) -> str:
+        """
+        Asynchronous version of enrollment.
+        :param audio_path: Path to the audio file
+        :param username: User-chosen nickname (Optional)
+        :param azure_id: Azure ID (Optional)
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, 5 seconds (Optional, default: False)
+        :return: Azure operation ID assigned to this enrolment request status
+        """
+
+        return await self.__run_in_pool(self.enrollment, audio_path=audio_path, username=username, azure_id=azure_id,
+                                        short_audio=short_audio)
+
+    def submit_enrollment(self, audio_path: str, username: str = None, azure_id: str = None,
+                          short_audio: bool = False) -> Future:
+        """
+        Starts an enrollment in the backend thread pool and returns immediately, so that the caller can keep doing other
+        work (i.e. GUI updates, further recordings) while Azure processes it.
+        :param audio_path: Path to the audio file
+        :param username: User-chosen nickname (Optional)
+        :param azure_id: Azure ID (Optional)
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, 5 seconds (Optional, default: False)
+        :return: Future resolving to the outcome of the enrollment, in the same format as wait_for_operation
+        """
+
+        return self._pool.submit(self.enrollment_sync, audio_path=audio_path, username=username, azure_id=azure_id,
+                                 short_audio=short_audio)
+
+    def enrollment_sync(self, audio_path: str, username: str = None, azure_id: str = None, short_audio: bool = False,
+                        timeout: float = 300.0) -> (str, str):
+        """
+        Performs an enrollment and waits for Azure to process it, polling as in wait_for_operation.
+        :param audio_path: Path to the audio file
+        :param username: User-chosen nickname (Optional)
+        :param azure_id: Azure ID (Optional)
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, 5 seconds (Optional, default: False)
+        :param timeout: Maximum time (in seconds) to wait for Azure to process the enrollment
+        :return: tuple of strings in the format (enrollment status, message)
+        """
+
+        op_id = self.enrollment(audio_path=audio_path, username=username, azure_id=azure_id, short_audio=short_audio)
+        return self.wait_for_operation(operation_id=op_id, enrollment=True, identification=False, timeout=timeout)
     # --- --- ---
 
     # --- Logging in ---
@@ -297,68 +662,117 @@ class HillMyna:
         words = self.__words_manager.get_words(number=number)
         return words
 
-    def speech_to_text(self, audio_path: str, detailed: bool = False) -> List[str]:
+    def speech_to_text(self, audio_path: str, detailed: bool = False) -> FrozenSet[str]:
         """
-        Returns a list of words recognized in the given audio file.
+        Returns the set of words recognized in the given audio file, lowercase and without punctuation.
         :param audio_path: Path to the audio file
         :param detailed: if True, retrieves the detailed version of the Azure response
-        :return: List of recognized words
+        :return: Set of recognized words
         """
 
         ret = None
 
-        json_response = self.__SpeechClient.recognize(audio_path=audio_path, detailed=detailed)
-        if self.__debug:
-            print(json_response)
+        # files Azure would not accept are converted in memory, the caller's file is left untouched
+        audio_data = prepare_for_azure(path=audio_path)
+
+        # a recording submitted again (i.e. retries) is recognized only once, through the speech-to-text client cache;
+        # the digest of the WAV content is its key, whatever is actually uploaded (i.e. Ogg Opus)
+        digest = audio_digest(path=audio_path) if audio_data is None else bytes_digest(data=audio_data)
+
+        json_response = self.__recognize(audio_path=audio_path, detailed=detailed, audio_data=audio_data,
+                                         cache_key=digest)
+        logger.debug("%s", json_response)
 
         # retrieve Azure status
         status = json_response["RecognitionStatus"]
+        if status in _STT_ERRORS:
+            raise RuntimeError(_STT_ERRORS[status])
+
         if status == "Success":
             # retrieve recognized words as a string
             ret = json_response["NBest"][0]["Lexical"] if detailed else json_response["DisplayText"]
-            ret = ret.lower().strip(".")
 
-            # split the string by whitespace
-            ret = ret.split(" ")
+            # extract words, dropping any punctuation
+            ret = frozenset(_TOKEN_REGEX.findall(ret.lower()))
 
-        elif status == "NoMatch":
-            raise RuntimeError("No English word could be recognized in your recording.")
+        return ret
 
-        elif status == "InitialSilenceTimeout":
-            raise RuntimeError("Too much silence in the start of your recording.")
+    def __recognize(self, audio_path: str, detailed: bool = False, audio_data: bytes = None,
+                    cache_key: str = None) -> json:
+        """
+        Uploads the given audio file for speech-to-text, encoded as Ogg Opus if so configured; in case encoding fails,
+        the WAV file is uploaded instead.
+        :param audio_path: Path to the WAV audio file; ignored if audio_data is given
+        :param detailed: if True, retrieves the detailed version of the Azure response
+        :param audio_data: Content of the WAV audio file, if already in memory
+        :param cache_key: Key of the recognition result in the speech-to-text client cache (i.e. the audio digest)
+        :return: JSON object containing recognized text and other stats
+        """
 
-        elif status == "BabbleTimeout":
-            raise RuntimeError("Too much noise in the start of your recording.")
+        if self.opus_speech:
+            # the encoded file goes to the temporary directory, never next to the caller's file
+            opus_path = self.get_tmp_filename(prefix="speech", suffix=".ogg")
+            try:
+                to_opus(source=audio_path if audio_data is None else io.BytesIO(audio_data), opus_path=opus_path)
+            except (RuntimeError, ValueError) as e:
+                # i.e. libsndfile built without Opus support
+                logger.debug("Opus encoding failed, uploading WAV instead: %s", e)
+            else:
+                try:
+                    return self.__SpeechClient.recognize(audio_path=opus_path, detailed=detailed, cache_key=cache_key)
+                finally:
+                    os.remove(opus_path)
 
-        elif status == "Error":
-            raise RuntimeError("Microsoft Azure internal error.")
+        return self.__SpeechClient.recognize(audio_path=audio_path, detailed=detailed, audio_data=audio_data,
+                                             cache_key=cache_key)
 
-        return ret
+    async def speech_to_text_async(self, audio_path: str, detailed: bool = False) -> FrozenSet[str]:
+        """
+        Asynchronous version of speech_to_text.
+        :param audio_path: Path to the audio file
+        :param detailed: if True, retrieves the detailed version of the Azure response
+        :return: Set of recognized words
+        """
+
+        return await self.__run_in_pool(self.speech_to_text, audio_path=audio_path, detailed=detailed)
+
+    async def speech_to_text_many(self, audio_paths: List[str], detailed: bool = False) -> List[FrozenSet[str]]:
+        """
+        Recognizes words in several audio files at once (i.e. benchmarks), with as many requests in flight as the backend
+        thread pool allows.
+        :param audio_paths: Paths to the audio files
+        :param detailed: if True, retrieves the detailed version of the Azure responses
+        :return: List of sets of recognized words, in the same order as audio_paths
+        """
 
-    def __identification(self, audio_path: str, candidates: List[str], short_audio: bool = False) -> IdentificationResult or None:
+        return await asyncio.gather(*[self.speech_to_text_async(audio_path=audio_path, detailed=detailed)
+                                      for audio_path in audio_paths])
+
+    def __identification(self, audio_path: str, candidates: Sequence[str], short_audio: bool = False,
+                         audio_data: bytes = None, cancel: threading.Event = None) -> IdentificationResult or None:
         """
         Returns an IdentificationResult containing the identified User and the confidence in case of success, None otherwise.
         :param audio_path: Path to the audio file
-        :param candidates: List of Azure IDs representing the candidates for this identification procedure
+        :param candidates: Azure IDs representing the candidates for this identification procedure
         :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :param audio_data: Content of the audio file, if already read
+        :param cancel: Event that, once set, abandons the identification with a CancelledError (Optional)
         :return: IdentificationResult in case of successful identification, None otherwise
         """
 
         # perform identification
         op_id = self.__SpeakerClient.new_identification(audio_path=audio_path,
                                                         candidate_ids=candidates,
-                                                        short_audio=short_audio)
-
-        # wait for identification results
-        time.sleep(self.operation_check_time)
+                                                        short_audio=short_audio,
+                                                        audio_data=audio_data,
+                                                        cancel=cancel)
 
-        # check status
-        azure_id, confidence = self.operation_status(operation_id=op_id)
-        if self.__debug:
-            print("Azure ID: {azure_id} - Confidence: {conf}".format(azure_id=azure_id, conf=confidence))
+        # wait for identification results, checking less and less often
+        azure_id, confidence = self.wait_for_operation(operation_id=op_id, cancel=cancel)
+        logger.debug("Azure ID: %s - Confidence: %s", azure_id, confidence)
 
         if self.__SpeakerClient.is_valid(operation_id=azure_id):
-            if azure_id != self.NO_IDENTIFICATION and self.check_confidence(confidence=confidence):
+            if azure_id != _NO_MATCH_ID and self.check_confidence(confidence=confidence):
                 return IdentificationResult(user=self.__users_manager.get_by_azure_id(azure_id=azure_id),
                                             confidence=confidence)
             else:
@@ -369,68 +783,151 @@ class HillMyna:
             raise RuntimeError("Identification status: {status} - {msg}".format(status=azure_id,
                                                                                 msg=confidence))
 
-    def identification(self, audio_path: str, all_users: List[List[User]] = None, short_audio: bool = False, iteration: int = 1) -> User or None:
+    async def __identify_batches(self, audio_path: str, azure_id_batches: Sequence[Sequence[str]],
+                                 short_audio: bool = False, audio_data: bytes = None) -> List[IdentificationResult]:
         """
-        Returns the identified User in case of successful identification, None otherwise.
+        Performs one identification per list of candidates concurrently, so that their network round-trips and waits
+        overlap; Azure API constraints are enforced by the rate limiter of the identification client. As soon as a user
+        is identified, identifications still in progress are abandoned, and stop polling Azure; a list of candidates
+        failing does not prevent the others from identifying the user.
         :param audio_path: Path to the audio file
-        :param all_users: List of lists, each containing at most 10 User objects
+        :param azure_id_batches: Batches of candidates, each containing at most 10 Azure IDs
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :param audio_data: Content of the audio file, if already read
+        :return: List of IdentificationResult objects of the identified users (more than one only in case of ties)
+        """
+
+        loop = asyncio.get_event_loop()
+
+        # bound the number of executor threads waiting on the rate limiter at the same time
+        semaphore = asyncio.Semaphore(_IDENTIFICATION_CONCURRENCY)
+
+        # abandoned identifications stop at their next status check once cancel is set, freeing their threads
+        executor = ThreadPoolExecutor(max_workers=_IDENTIFICATION_CONCURRENCY)
+        cancel = threading.Event()
+
+        async def identify(candidates: Sequence[str]) -> IdentificationResult or None:
+            async with semaphore:
+                return await loop.run_in_executor(executor, functools.partial(self.__identification,
+                                                                              audio_path=audio_path,
+                                                                              candidates=candidates,
+                                                                              short_audio=short_audio,
+                                                                              audio_data=audio_data,
+                                                                              cancel=cancel))
+
+        def identified(task: asyncio.Future) -> bool:
+            if not task.done() or task.cancelled() or task.exception() is not None:
+                return False
+            # __identification only returns results for identified users
+            return task.result() is not None
+
+        tasks = [asyncio.ensure_future(identify(candidates)) for candidates in azure_id_batches]
+        errors = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    await next_done
+                except Exception as e:
+                    errors.append(e)
+                if any(identified(task) for task in tasks):
+                    # identifications completed in the meantime may have identified other users as well (ties)
+                    return [task.result() for task in tasks if identified(task)]
+
+            # nobody identified: a failed list of candidates might have contained the user
+            if len(errors) > 0:
+                raise errors[0]
+            return []
+        finally:
+            cancel.set()
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False)
+
+    def identification(self, audio_path: str = None, all_users: Sequence[Sequence[User]] = None,
+                       short_audio: bool = False, audio_data: bytes = None) -> User or None:
+        """
+        Returns the identified User in case of successful identification, None otherwise.
+        :param audio_path: Path to the audio file; ignored if audio_data is given
+        :param all_users: Batches of candidates, each containing at most 10 User objects (default: all registered users)
         :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
-        :param iteration: Number of iterations reached by the identification procedure, in case of ties
+        :param audio_data: Content of a 16 kHz mono PCM_16 WAV file already in memory (i.e. Audio.to_wav_bytes)
         :return: Identified User, or None in case of identification failure
         """
 
+        assert audio_path is not None or audio_data is not None, "An audio file must be provided."
+
+        # Azure IDs of registered users are cached along with their batches, those of given candidates are extracted once
         if all_users is None:
             all_users = self.__users_manager.get_all_users()
+            azure_id_batches = self.__users_manager.get_all_azure_ids()
+        else:
+            azure_id_batches = [[c.azure_id for c in candidates] for candidates in all_users]
 
-            # balance out the last identification request not to have only 1 candidate (if possible)
-            if len(all_users) > 1 and len(all_users[-1]) == 1:
-                all_users[-1].append(all_users[-2].pop())
-
-        # iterate on user lists of size at most 10
-        identified_users = []
-        iters = 1
-        if self.__debug:
-            print("Performing identification (iteration {num})...".format(num=iteration))
+        if self.single_candidate_shortcut and len(all_users) == 1 and len(all_users[0]) == 1:
+            logger.debug("Skipping Azure identification, single candidate.")
+            return all_users[0][0]
 
-        for candidates in all_users:
-            result = self.__identification(audio_path=audio_path,
-                                           candidates=[c.azure_id for c in candidates],
-                                           short_audio=short_audio)
+        if audio_data is None:
+            # files Azure would not accept are converted in memory, the caller's file is left untouched
+            audio_data = prepare_for_azure(path=audio_path)
 
-            if result is not None and result.user.azure_id != self.NO_IDENTIFICATION:
-                identified_users.append(result.user)
+        # identify on user lists of size at most 10, all at the same time, until a user is identified
+        logger.debug("Performing identification...")
 
-                if self.__debug:
-                    print("\t- {user} with confidence {conf}".format(user=result.user.username,
-                                                                     conf=result.confidence))
+        if len(azure_id_batches) == 1:
+            # a single list of candidates (up to 10 users) needs neither an event loop nor worker threads
+            result = self.__identification(audio_path=audio_path,
+                                           candidates=azure_id_batches[0],
+                                           short_audio=short_audio,
+                                           audio_data=audio_data)
+            results = [result] if result is not None else []
+        else:
+            # the same recording is uploaded for every list of candidates, hence it is read only once
+            if audio_data is None:
+                with open(audio_path, "rb") as f:
+                    audio_data = f.read()
 
-            # enforce API constraints
-            iters += 1
-            if iters == 9:
-                if self.__debug:
-                    print("Waiting in order not to get banned for Azure API constraints.")
-                time.sleep(65)
-                iters = 1
+            results = asyncio.run(self.__identify_batches(audio_path=audio_path,
+                                                          azure_id_batches=azure_id_batches,
+                                                          short_audio=short_audio,
+                                                          audio_data=audio_data))
+        for result in results:
+            logger.debug("\t- %s with confidence %s", result.user.username, result.confidence)
 
-        if self.__debug:
-            print("Done.")
+        logger.debug("Done.")
 
         # in case no user could be identified
-        if len(identified_users) == 0:
+        if len(results) == 0:
             return None
 
-        # there has been a single identified user - should be the norm
-        elif len(identified_users) == 1:
-            return identified_users[0]
+        # ties are broken by the confidence Azure reported for each identified user, the earliest list of candidates
+        # winning among equally confident ones
+        return max(results, key=lambda r: _CONFIDENCE_RANKS.get(r.confidence, 0)).user
 
-        # recursively break ties, if multiple users have been identified
-        else:
-            user = self.identification(audio_path=audio_path,
-                                       all_users=[identified_users],
-                                       short_audio=short_audio,
-                                       iteration=iteration + 1)
+    async def identification_async(self, audio_path: str, short_audio: bool = False) -> User or None:
+        """
+        Asynchronous version of identification, on all registered users.
+        :param audio_path: Path to the audio file
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :return: Identified User, or None in case of identification failure
+        """
+
+        return await self.__run_in_pool(self.identification, audio_path=audio_path, short_audio=short_audio)
+
+    def submit_identification(self, audio_path: str = None, all_users: Sequence[Sequence[User]] = None,
+                              short_audio: bool = False, audio_data: bytes = None) -> Future:
+        """
+        Starts an identification in the backend thread pool and returns immediately, so that the caller (i.e. the GUI)
+        stays responsive while Azure processes it.
+        :param audio_path: Path to the audio file; ignored if audio_data is given
+        :param all_users: Batches of candidates, each containing at most 10 User objects (default: all registered users)
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :param audio_data: Content of a 16 kHz mono PCM_16 WAV file already in memory (i.e. Audio.to_wav_bytes)
+        :return: Future resolving to the identified User, or None in case of identification failure
+        """
 
-            return user
+        return self._pool.submit(self.identification, audio_path=audio_path, all_users=all_users,
+                                 short_audio=short_audio, audio_data=audio_data)
 
     def get_users_number(self) -> int:
         """
@@ -440,10 +937,10 @@ class HillMyna:
 
         return self.__users_manager.get_users_number()
 
-    def get_all_users(self):
+    def get_all_users(self) -> Tuple[Tuple[User, ...], ...]:
         """
         Proxy method for UsersManager.
-        :return: List of lists, each containing at most 10 User objects
+        :return: Tuple of tuples, each containing at most 10 User objects
         """
 
         return self.__users_manager.get_all_users()
@@ -451,6 +948,15 @@ class HillMyna:
     def get_by_username(self, username:str) -> User:
         return self.__users_manager.get_by_username(username)
 
+    def has_username(self, username: str) -> bool:
+        """
+        Proxy method for UsersManager.
+        :param username: Username to look for
+        :return: True if the username is already taken, False otherwise
+        """
+
+        return self.__users_manager.has_username(username=username)
+
     def update_status(self, azure_id: str, new_status: str) -> None:
         """
         Updates a user status with the given one.
@@ -475,20 +981,16 @@ class HillMyna:
         audio_path = self.get_tmp_filename(prefix="audio",
                                            suffix=".wav")
 
-        with open("{base}/{fn}".format(base=self.data_directory,
-                                       fn=self.enrollment_fn)) as f:
+        with open(self.enrollment_path) as f:
             for line in f:
                 print(line.strip("\n"))
 
         audio = self.start_recording(audio_path=audio_path,
                                      duration=60,
                                      blocking=True)
-        op_id = self.enrollment(azure_id=usr.azure_id,
-                                audio_path=audio_path)
-        time.sleep(self.operation_check_time)
-        result = self.operation_status(operation_id=op_id,
-                                       enrollment=True,
-                                       identification=False)
+        audio.flush()
+        result = self.enrollment_sync(azure_id=usr.azure_id,
+                                      audio_path=audio_path)
         print(result)
         audio.delete()
         print(self.__SpeakerClient.get_profile(profile_id=usr.azure_id))
@@ -506,12 +1008,52 @@ class HillMyna:
                                      duration=20)
         time.sleep(15)
         audio.stop()
+        audio.flush()
         user = self.identification(audio_path=audio_path,
                                    short_audio=True)
         audio.delete()
         print("\nIdentified user: {u}".format(u=user))
     # --- --- ---
 
+    # --- Benchmarks ---
+    # threshold tuning, spoofing attacks
+    def benchmark(self, audio_paths: List[str], short_audio: bool = False, max_workers: int = 16) -> List[BenchmarkResult]:
+        """
+        Evaluates speech-to-text and identification on many audio files, several of them at a time; all requests go
+        through the shared connection pool, and the identification client paces them according to Azure quotas.
+        :param audio_paths: Paths to the audio files
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :param max_workers: Maximum number of audio files evaluated concurrently
+        :return: List of BenchmarkResult objects, in the same order as audio_paths
+        """
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(functools.partial(self.__evaluate, short_audio=short_audio), audio_paths))
+
+    def __evaluate(self, audio_path: str, short_audio: bool = False) -> BenchmarkResult:
+        """
+        Evaluates speech-to-text and identification on a single audio file.
+        :param audio_path: Path to the audio file
+        :param short_audio: if True, audio can be as short as 1 second; otherwise, minimum length is 5 seconds (5 minutes max anyway)
+        :return: BenchmarkResult object
+        """
+
+        words = None
+        user = None
+        error = None
+        start = time.perf_counter()
+        try:
+            words = self.speech_to_text(audio_path=audio_path)
+            user = self.identification(audio_path=audio_path,
+                                       short_audio=short_audio)
+        except Exception as e:
+            # any failure (i.e. an unreadable file, a malformed response) only affects this file's result
+            error = str(e) or repr(e)
+
+        return BenchmarkResult(audio_path=audio_path, words=words, user=user, elapsed=time.perf_counter() - start,
+                               error=error)
+    # --- --- ---
+
 
 if __name__ == "__main__":
     h = HillMyna(data_directory="../data", tmp_directory="../tmp", debug=True)
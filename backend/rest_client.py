@@ -3,10 +3,24 @@ This file contains source code for handling all the REST requests involved in th
 """
 from collections import namedtuple
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
+from urllib3.util.retry import Retry
 from json.decoder import JSONDecodeError
+import threading
+import certifi
 import typing
 import json
+import ssl
+
+# orjson parses and serializes JSON several times faster than the standard library, when available
+try:
+    from orjson import loads as _json_loads, dumps as _json_dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
 
 """
 SimpleResponse object returns the outcome of a REST request, in the following format:
@@ -18,35 +32,138 @@ SimpleResponse object returns the outcome of a REST request, in the following fo
 SimpleResponse = namedtuple("SimpleResponse", "code content headers message")
 
 
+class _SSLContextAdapter(HTTPAdapter):
+    """
+    HTTP adapter handing the same SSL context to every connection pool, so that CA certificates are only loaded once.
+    """
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs):
+        """
+        _SSLContextAdapter constructor.
+        :param ssl_context: SSL context to be used for all HTTPS connections
+        :param kwargs: Keyword arguments for HTTPAdapter
+        """
+
+        self.__ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.__ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+
+        # the shared context already holds the default CA certificates, which urllib3 would otherwise load into it again
+        # for every new connection; custom CA bundles (verify given as a path) are still loaded
+        if verify is True:
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
+
 class RESTClient:
     """
     REST client implementing the HTTP methods that are required in order to work with Microsoft Azure.
     This wrapper class doesn't target any specific Azure service.
     """
 
-    def __init__(self, debug: bool = False):
+    # process-wide instance returned by RESTClient.instance()
+    _INSTANCE = None
+    _INSTANCE_LOCK = threading.RLock()
+
+    # SSL context shared by all the REST clients, created along with the first one
+    _SSL_CONTEXT = None
+
+    @classmethod
+    def instance(cls, debug: bool = False) -> "RESTClient":
+        """
+        Returns the REST client shared by the whole process, creating it on first call.
+        :param debug: if True, every REST request prints some stats to the standard output; only used on first call
+        :return: shared RESTClient object
+        """
+
+        with cls._INSTANCE_LOCK:
+            if cls._INSTANCE is None:
+                cls._INSTANCE = cls(debug=debug)
+            return cls._INSTANCE
+
+    def __init__(self, debug: bool = False, pool_connections: int = 4, pool_maxsize: int = 32):
         """
         REST client constructor method.
         :param debug: if True, every REST request prints some stats to the standard output
+        :param pool_connections: Number of per-host connection pools to cache
+        :param pool_maxsize: Maximum number of connections kept alive in each pool
         """
         self.__debug = debug
 
-    def get(self, url: str, headers: dict = None, params: dict = None, expect_json: bool = True) -> SimpleResponse:
+        # a single session keeps TCP/TLS connections alive across requests; transient failures are retried with backoff,
+        # but not 429 (Too Many Requests): retrying would spend more of an already exhausted quota, behind the back of
+        # the rate limiters of the Azure clients
+        retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+        with RESTClient._INSTANCE_LOCK:
+            if RESTClient._SSL_CONTEXT is None:
+                RESTClient._SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+        adapter = _SSLContextAdapter(ssl_context=RESTClient._SSL_CONTEXT, pool_connections=pool_connections,
+                                     pool_maxsize=pool_maxsize, max_retries=retries)
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Underlying HTTP session, keeping connections alive across requests.
+        :return: requests.Session object used for all the requests of this client
+        """
+
+        return self._session
+
+    def warm_up(self, url: str) -> bool:
+        """
+        Opens a connection to the given URL (TCP and TLS handshakes) with an HTTP HEAD request, so that it is already
+        in the pool when the first actual request is made.
+        :param url: URL of the host to connect to
+        :return: True if the host responded, whatever the HTTP status code, False otherwise
+        """
+
+        try:
+            req = self._session.head(url=url)
+            if self.__debug:
+                print("HEAD {url} responded with {code}: {msg}".format(url=req.url,
+                                                                       code=req.status_code,
+                                                                       msg=req.reason))
+            req.close()
+            return True
+        except RequestException:
+            return False
+
+    def close(self) -> None:
+        """
+        Closes all the pooled connections; new ones are opened on demand if the client is used again.
+        :return: None
+        """
+
+        self._session.close()
+
+    def get(self, url: str, headers: dict = None, params: dict = None,
+            expect_json: bool = True, response_headers: bool = False) -> SimpleResponse:
         """
         Performs an HTTP GET request.
         :param url: URL to which perform the GET request to
         :param headers: HTTP headers to be specified
         :param params: HTTP parameters to be passed in the URL querystring
         :param expect_json: if True, the client expects a JSON content response and will try to parse it, otherwise it will read plain HTML from the web page
+        :param response_headers: if True, the returning SimpleResponse will also contain the response headers, otherwise None
         :return: SimpleResponse object as previously defined
         """
         code = -1
         content = None
+        resp_headers = None
         msg = ""
         try:
-            req = requests.get(url=url,
-                               headers=headers,
-                               params=params)
+            req = self._session.get(url=url,
+                                    headers=headers,
+                                    params=params)
 
             code = req.status_code
             msg = req.reason
@@ -54,9 +171,10 @@ class RESTClient:
                 print("GET {url} responded with {code}: {msg}".format(url=req.url,
                                                                       code=code,
                                                                       msg=msg))
+            resp_headers = req.headers if response_headers else None
 
             # fetch JSON in case it is expected one, otherwise retrieve response body as a string
-            content = req.json() if expect_json else str(req.text)
+            content = _json_loads(req.content) if expect_json else str(req.text)
             req.close()
         except JSONDecodeError:
             content = None
@@ -71,16 +189,16 @@ class RESTClient:
             content = None
             msg = "General error"
 
-        return SimpleResponse(code=code, content=content, headers=None, message=msg)
+        return SimpleResponse(code=code, content=content, headers=resp_headers, message=msg)
 
-    def post(self, url: str, body: json = None, data: typing.BinaryIO = None,
+    def post(self, url: str, body: json = None, data: typing.Union[typing.BinaryIO, bytes, memoryview] = None,
              headers: dict = None, params: dict = None,
              expect_json: bool = True, response_headers: bool = False) -> SimpleResponse:
         """
         Performs an HTTP POST request.
         :param url: URL to which perform the POST request to
         :param body: JSON content to be POSTed to the URL; mutually exclusive with data
-        :param data: binary content to be POSTed to the URL; mutually exclusive with body
+        :param data: binary content (file object or bytes-like object) to be POSTed to the URL; mutually exclusive with body
         :param headers: HTTP headers to be specified
         :param params: HTTP parameters to be passed in the URL querystring
         :param expect_json: if True, the client expects a JSON content response and will try to parse it, otherwise it will read plain HTML from the web page
@@ -96,19 +214,22 @@ class RESTClient:
                 raise RequestException("Parameters 'body' and 'data' are mutually exclusive.")
 
             if body is not None:
-                req = requests.post(url=url,
-                                    headers=headers,
-                                    params=params,
-                                    json=body)
+                # JSON bodies are serialized here rather than by requests, as requests would always use the json module
+                headers = dict(headers) if headers is not None else {}
+                headers.setdefault("Content-Type", "application/json")
+                req = self._session.post(url=url,
+                                         headers=headers,
+                                         params=params,
+                                         data=_json_dumps(body))
             elif data is not None:
-                req = requests.post(url=url,
-                                    headers=headers,
-                                    params=params,
-                                    data=data)
+                req = self._session.post(url=url,
+                                         headers=headers,
+                                         params=params,
+                                         data=data)
             else:
-                req = requests.post(url=url,
-                                    headers=headers,
-                                    params=params)
+                req = self._session.post(url=url,
+                                         headers=headers,
+                                         params=params)
 
             code = req.status_code
             msg = req.reason
@@ -117,7 +238,7 @@ class RESTClient:
                                                                        code=code,
                                                                        msg=msg))
             # fetch JSON in case it is expected one, otherwise retrieve response body as a string
-            content = req.json() if expect_json else str(req.text)
+            content = _json_loads(req.content) if expect_json else str(req.text)
             resp_headers = req.headers if response_headers else None
             req.close()
         except JSONDecodeError:
@@ -148,9 +269,9 @@ class RESTClient:
         content = None
         msg = ""
         try:
-            req = requests.delete(url=url,
-                                  headers=headers,
-                                  params=params)
+            req = self._session.delete(url=url,
+                                       headers=headers,
+                                       params=params)
 
             code = req.status_code
             msg = req.reason
@@ -159,7 +280,7 @@ class RESTClient:
                                                                          code=code,
                                                                          msg=msg))
             # fetch JSON in case it is expected one, otherwise retrieve response body as a string
-            content = req.json() if expect_json else str(req.text)
+            content = _json_loads(req.content) if expect_json else str(req.text)
             req.close()
         except JSONDecodeError:
             content = None
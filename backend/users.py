@@ -3,7 +3,7 @@ This file contains all the source code needed to handle and query user profiles
 """
 
 from collections import namedtuple
-from typing import List
+from typing import Tuple
 import os.path
 import json
 
@@ -29,6 +29,13 @@ class UsersManager:
         # Creation of a dictionary for future use, each entry formed by a string and a User
         self.__dictionary = {}
 
+        # index mapping each username to the Azure ID of its user
+        self.__usernames = {}
+
+        # users split into identification batches, and the Azure IDs of each batch, computed again only after users change
+        self.__batches = None
+        self.__azure_id_batches = None
+
         # creates an empty json if there is no json
         if not os.path.exists(users_path):
             self.__write_file()
@@ -47,13 +54,17 @@ class UsersManager:
                           status=user[4])
 
             self.__dictionary[azure_id] = person
+            self.__usernames[person.username] = azure_id
 
     def __write_file(self) -> None:
         """
-        Writes the internal dictionary holding users data to a JSON file.
+        Writes the internal dictionary holding users data to a JSON file; as users have changed, batches are invalidated.
         :return: None
         """
 
+        self.__batches = None
+        self.__azure_id_batches = None
+
         with open(self.__path, "w") as f:
             json.dump(self.__dictionary, f, indent=4)
 
@@ -65,7 +76,8 @@ class UsersManager:
         """
 
         if azure_id in self.__dictionary:
-            self.__dictionary.pop(azure_id)
+            user = self.__dictionary.pop(azure_id)
+            self.__usernames.pop(user.username, None)
 
             # update JSON file
             self.__write_file()
@@ -85,12 +97,12 @@ class UsersManager:
 
         if azure_id in self.__dictionary:
             raise KeyError("Azure_id already existing, insert a new one in order to register the new user")
-        for _, values in self.__dictionary.items():
-            if username == values.username:
-                raise KeyError("Username already taken, please choose one that has not been chosen")
+        if self.has_username(username):
+            raise KeyError("Username already taken, please choose one that has not been chosen")
 
         person = User(azure_id, username, name, surname, status)
         self.__dictionary[azure_id] = person
+        self.__usernames[username] = azure_id
 
         # update JSON file
         self.__write_file()
@@ -130,37 +142,54 @@ class UsersManager:
         :param username: contains the username of a user in order to search for its informations
         :return : Returns a dictionary containing every information of a certain user
         """
-        for _, current_user in self.__dictionary.items():
-            if username == current_user.username:
-                return current_user
-        raise KeyError("No user with such username exists. please retry with an existing one")
+        azure_id = self.__usernames.get(username)
+        if azure_id is None:
+            raise KeyError("No user with such username exists. please retry with an existing one")
+        return self.__dictionary[azure_id]
+
+    def has_username(self, username: str) -> bool:
+        """
+        Returns whether a user with the given username exists.
+        :param username: username to look for
+        :return: True if the username is already taken, False otherwise
+        """
+        return username in self.__usernames
 
-    def get_all_users(self) -> List[List[User]]:
+    def get_all_users(self) -> Tuple[Tuple[User, ...], ...]:
         """
-        The function returns a list of lists, containing each one at most 10 Users.
-        :return: A list of lists, each one containing at most 10 Users
+        The function returns a tuple of tuples, containing each one at most 10 Users; the last one contains a single User
+        only if there are no others to balance it out with. The result is cached until users change.
+        :return: A tuple of tuples, each one containing at most 10 Users
         """
-        all_users = []
-        batch = []
-        for _, current_user in self.__dictionary.items():
-            batch.append(current_user)
+        if self.__batches is None:
+            users = list(self.__dictionary.values())
+            bounds = list(range(0, len(users), 10)) + [len(users)]
 
-            if len(batch) == 10:
-                all_users.append(batch)
-                batch = []
-        if len(batch) > 0:
-            all_users.append(batch)
+            # balance out the last batch not to have only 1 user (if possible)
+            if len(bounds) > 2 and bounds[-1] - bounds[-2] == 1:
+                bounds[-2] -= 1
+
+            self.__batches = tuple(tuple(users[start:end]) for start, end in zip(bounds, bounds[1:]))
+
+        return self.__batches
+
+    def get_all_azure_ids(self) -> Tuple[Tuple[str, ...], ...]:
+        """
+        The function returns the Azure IDs of the users in each batch returned by get_all_users, in the same order.
+        The result is cached until users change.
+        :return: A tuple of tuples, each one containing at most 10 Azure IDs
+        """
+        if self.__azure_id_batches is None:
+            self.__azure_id_batches = tuple(tuple(user.azure_id for user in batch) for batch in self.get_all_users())
 
-        return all_users
+        return self.__azure_id_batches
 
     def get_users_number(self) -> int:
         """
         The function returns the total number of users.
         :return: The total number of users as an integer.
         """
-        users_number = self.get_all_users()
-        users_number = [len(l) for l in users_number]
-        return sum(users_number)
+        return len(self.__dictionary)
 
 
 if __name__ == "__main__":
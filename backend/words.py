@@ -23,20 +23,14 @@ class WordManager:
         if not os.path.isfile(words_path):
             raise FileNotFoundError("{file} must be a regular file.".format(file=words_path))
 
-        self.words = set()
         self.__debug = debug
 
         if self.__debug:
             print("Reading words file {file}...".format(file=words_path))
 
+        # words are normalized once and kept as a duplicate-free tuple, which random.sample draws from directly
         with open(words_path) as file:
-            for line in file:
-                line = line.strip("\n")
-
-                if len(line) <= 0:
-                    continue
-
-                self.words.add(line)
+            self.words = tuple(dict.fromkeys(word for word in (line.strip().lower() for line in file) if word))
 
         if self.__debug:
             print("Done: {num} words in the dictionary.".format(num=len(self.words)))
@@ -4,8 +4,6 @@ This file contains source code for starting the GUI of Hill Myna.
 from appJar.appjar import ItemLookupError
 from backend.hill_myna_be import HillMyna
 from appJar import gui
-import time
-from datetime import datetime
 
 
 class HillMynaGUI:
@@ -104,8 +102,7 @@ class HillMynaGUI:
         """
 
         if self.__main_window.getButton("identification_rec") == "rec":
-            audio_path = "{base}/audio{ts}.wav".format(base=self.__backend.tmp_directory,
-                                                       ts=time.mktime(datetime.utcnow().timetuple()))
+            audio_path = self.__backend.get_tmp_filename(prefix="audio", suffix=".wav")
             self.__audio = self.__backend.start_recording(audio_path, duration=60)
             self.__main_window.setButton("identification_rec", "stop")
         elif self.__main_window.getButton("identification_rec") == "stop":
@@ -116,35 +113,56 @@ class HillMynaGUI:
                 self.__main_window.addMessage(title="identification_status", text="Recognizing words...")
                 if self.__debug:
                     print("Recognizing words...")
-                recognized_words = set(self.__backend.speech_to_text(self.__audio.path))
+                self.__audio.flush()
+                recognized_words = self.__backend.speech_to_text(self.__audio.path)
                 if self.__debug:
                     print("Expected: {w}".format(w=self.__display_words))
                     print("Recognized: {w}".format(w=recognized_words))
-                intersection = recognized_words.intersection(set(self.__display_words))
+                intersection = recognized_words.intersection(self.__display_words)
                 if self.__debug:
                     print("Correctly recognized {n} words: {w}".format(n=len(intersection), w=intersection))
-                user = None
-                if len(recognized_words.intersection(set(self.__display_words))) >= self.__backend.word_threshold:
+                if len(intersection) >= self.__backend.word_threshold:
                     self.__main_window.setMessage(title="identification_status", text="Identifying user...")
                     if self.__debug:
                         print("Identifying user...")
                     selected_users = [self.__backend.get_by_username(username="angelo"),
                                       self.__backend.get_by_username(username="emanuele"),
                                       self.__backend.get_by_username(username="matteo")]
-                    user = self.__backend.identification(self.__audio.path, all_users=[selected_users], short_audio=True)
-                    if user is not None:
-                        self.__main_window.setMessage(title="identification_status", text="Logged in as {user}".format(user=str(user.username)))
-                    else:
-                        self.__main_window.setMessage(title="identification_status", text="No user could be identified.")
-                else:
-                    self.__main_window.setMessage(title="identification_status",
-                                                  text="Too few words have been recognized ({n} instead of {t}).".format(n=len(intersection),
-                                                                                                                         t=self.__backend.word_threshold))
-                self.__main_window.addButton("Logout" if user is not None else "Try again", func=self.logout_function)
+                    # actual identification, carried out in the background while the GUI stays responsive
+                    future = self.__backend.submit_identification(self.__audio.path, all_users=[selected_users],
+                                                                  short_audio=True)
+                    audio = self.__audio
+                    future.add_done_callback(lambda f: self.__main_window.queueFunction(self.identification_done, f,
+                                                                                        audio))
+                    return
+                self.__main_window.setMessage(title="identification_status",
+                                              text="Too few words have been recognized ({n} instead of {t}).".format(n=len(intersection),
+                                                                                                                     t=self.__backend.word_threshold))
+                self.__main_window.addButton("Try again", func=self.logout_function)
                 self.__audio.delete()
             except Exception as e:
                 self.__audio.delete()
                 self.__main_window.errorBox("Error:", str(e))
+
+    def identification_done(self, future, audio) -> None:
+        """
+        Shows the outcome of an identification, once Azure has processed it; always run by the GUI thread.
+        :param future: Future of the identification, as returned by the backend
+        :param audio: Audio object of the identification recording
+        :return: None
+        """
+
+        audio.delete()
+        try:
+            user = future.result()
+            if user is not None:
+                self.__main_window.setMessage(title="identification_status", text="Logged in as {user}".format(user=str(user.username)))
+            else:
+                self.__main_window.setMessage(title="identification_status", text="No user could be identified.")
+            self.__main_window.openTab("MainWindow", "Login")
+            self.__main_window.addButton("Logout" if user is not None else "Try again", func=self.logout_function)
+        except Exception as e:
+            self.__main_window.errorBox("Error:", str(e))
     # --- --- ---
 
     # --- User management ---
@@ -182,11 +200,9 @@ class HillMynaGUI:
         if self.has_numbers(name) or self.has_numbers(surname):
             self.__main_window.errorBox("TypingErrorBox", "Error: A name can't contain a number", "New profile")
 
-        for users in self.__backend.get_all_users():
-            for user in users:
-                if user.username == username:
-                    self.__main_window.errorBox("UserAlreadyExisting:", "Username already in use, please choose a different "
-                                                                       "one", "New profile")
+        if self.__backend.has_username(username):
+            self.__main_window.errorBox("UserAlreadyExisting:", "Username already in use, please choose a different "
+                                                               "one", "New profile")
         try:
             self.__backend.new_profile(username, name, surname)
             user = self.__backend.get_by_username(username)
@@ -265,9 +281,8 @@ class HillMynaGUI:
         """
 
         self.__main_window.startSubWindow("REC")
-        text = open(self.__backend.data_directory+"/{text}".format(text=self.__backend.enrollment_fn), "r")
-        self.__main_window.addMessage("Play", text="Please read the following text:\n\n {words}".format(words=text.read()))
-        text.close()
+        with open(self.__backend.enrollment_path, "r") as text:
+            self.__main_window.addMessage("Play", text="Please read the following text:\n\n {words}".format(words=text.read()))
         self.__main_window.addNamedButton("rec", "enrollment_rec", self.rec_enrollment)
         self.__main_window.setStopFunction(self.__main_window.destroyAllSubWindows)
         self.__main_window.stopSubWindow()
@@ -279,8 +294,7 @@ class HillMynaGUI:
         """
 
         if self.__main_window.getButton("enrollment_rec") == "rec":
-            audio_path = "{base}/audio{ts}.wav".format(base=self.__backend.tmp_directory,
-                                                       ts=time.mktime(datetime.utcnow().timetuple()))
+            audio_path = self.__backend.get_tmp_filename(prefix="audio", suffix=".wav")
             if self.__debug:
                 print(audio_path)
             self.__audio = self.__backend.start_recording(audio_path, blocking=False, duration=70)
@@ -290,20 +304,38 @@ class HillMynaGUI:
             user = self.__main_window.getTableRow("UsersTable", self._row_number)[0]
             usr = self.__backend.get_by_username(username=user)
             self.__main_window.destroyAllSubWindows()
-            # actual enrollment
+            # actual enrollment, carried out in the background while the GUI stays responsive
             try:
-                op_id = self.__backend.enrollment(azure_id=usr.azure_id, audio_path=self.__audio.path)
-                self.__audio.delete()
-                time.sleep(self.__backend.operation_check_time)
-                result = self.__backend.operation_status(operation_id=op_id,
-                                                         enrollment=True,
-                                                         identification=False)
-                self.__main_window.infoBox("Result", result[1])
-                if result[0] not in ("running", "not started", "failed"):
-                    self.__backend.update_status(azure_id=usr.azure_id, new_status=result[0])
-                    self.__main_window.replaceTableRow("UsersTable", self._row_number, [usr.username, result[0]])
+                self.__audio.flush()
+                future = self.__backend.submit_enrollment(azure_id=usr.azure_id, audio_path=self.__audio.path)
             except Exception as e:
                 self.__main_window.errorBox("Error:", str(e))
+                return
+
+            audio = self.__audio
+            row_number = self._row_number
+            future.add_done_callback(lambda f: self.__main_window.queueFunction(self.enrollment_done, f, usr, row_number,
+                                                                                audio))
+
+    def enrollment_done(self, future, usr, row_number, audio) -> None:
+        """
+        Shows the outcome of an enrollment, once Azure has processed it; always run by the GUI thread.
+        :param future: Future of the enrollment, as returned by the backend
+        :param usr: User the enrollment refers to
+        :param row_number: Row of the users table showing the user
+        :param audio: Audio object of the enrollment recording
+        :return: None
+        """
+
+        audio.delete()
+        try:
+            result = future.result()
+            self.__main_window.infoBox("Result", result[1])
+            if result[0] not in ("running", "not started", "failed"):
+                self.__backend.update_status(azure_id=usr.azure_id, new_status=result[0])
+                self.__main_window.replaceTableRow("UsersTable", row_number, [usr.username, result[0]])
+        except Exception as e:
+            self.__main_window.errorBox("Error:", str(e))
     # --- --- ---
 
     def start(self) -> None:
@@ -312,7 +344,9 @@ class HillMynaGUI:
         :return: None
         """
 
+        self.__backend.warm_up()
         self.__main_window.go()
+        self.__backend.close()
 
 
 if __name__ == "__main__":